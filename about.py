@@ -1,6 +1,5 @@
 #import the necessary libraries
 import streamlit as st
-from PIL import Image
 
 def app():
     st.title('Lymphatic Filariasis (LF) and Soil Transmitted Helminthiasis (STH) Data Explorer')
@@ -0,0 +1,107 @@
+"""Comparative metrics per country, precomputed once per data snapshot.
+
+The tables only showed averages over the selected years. `Analytics` works
+out, for every country and year of a cube at once:
+
+- the year over year change in national coverage,
+- each country's rank by national coverage among the countries reporting
+  that year (1 is the highest),
+- how many years in a row coverage has been below the WHO target,
+- the treatment gap, people requiring PC minus people treated,
+
+and keeps prefix sums of them along the years like the cube does, so the
+per-country summary for any selection (`Analytics.table`) costs the same
+whatever the year range. The CAGR of people treated only needs the first
+and last year with treatments in the range.
+"""
+import numpy as np
+import pandas as pd
+
+# summary columns added to the tables, and whether a higher value is better
+# (the maps use that to pick the direction of the colour scale)
+CHANGE = "Coverage change per year"
+CAGR = "CAGR of people treated (%)"
+RANK = "Coverage rank"
+STREAK = "Years below target"
+GAP = "Treatment gap"
+METRICS = {CHANGE: True, CAGR: True, RANK: False, STREAK: False, GAP: False}
+
+
+def _prefix(values):
+    """prefix sums along the years of a (country, year) array, NaN counted as 0"""
+    out = np.zeros((values.shape[0], values.shape[1] + 1))
+    out[:, 1:] = np.nan_to_num(values).cumsum(axis=1)
+    return out
+
+
+def _streaks(below):
+    """length of the run of True ending at each year, per row"""
+    run = np.zeros(below.shape, dtype=np.int64)
+    for y in range(below.shape[1]):  # one pass over the ~20 years, vectorized over countries
+        run[:, y] = np.where(below[:, y], (run[:, y - 1] if y else 0) + 1, 0)
+    return run
+
+
+class Analytics:
+    """Per-country, per-year comparisons over one cube.
+
+    Parameters
+    ----------
+    cube:
+        the `Cube` of the dataset.
+    coverage, required, treated:
+        metric names of the national coverage, the population requiring PC
+        and the number of people treated.
+    target:
+        the WHO coverage target, in the unit of `coverage`; years below it
+        count towards STREAK.
+    """
+    def __init__(self, cube, coverage, required, treated, target):
+        self.cube = cube
+        self.target = target
+        years, means = cube.yearly(cube.countries, cube.years[0], cube.years[-1] + 1)
+        m = cube.metrics.get_loc
+        cov, req, self.treated = means[..., m(coverage)], means[..., m(required)], means[..., m(treated)]
+        reported = ~np.isnan(cov)
+
+        change = np.full(cov.shape, np.nan)
+        change[:, 1:] = cov[:, 1:] - cov[:, :-1]
+        self.change, self.change_n = _prefix(change), _prefix(~np.isnan(change))
+        # rank within each year among the countries that reported
+        self.rank = pd.DataFrame(cov).rank(axis=0, ascending=False, method="min").to_numpy()
+        self.streak = _streaks(reported & (cov < target))
+        gap = req - self.treated
+        self.gap, self.gap_n = _prefix(gap), _prefix(reported)
+
+    def table(self, countries, lo, hi):
+        """Per-country summary over the years [lo, hi), in the order of `Cube.means`.
+
+        RANK is the rank in the last year of the range, STREAK the longest run
+        of years below the target inside it and GAP the mean yearly gap.
+        """
+        codes = np.sort(self.cube.codes(countries))
+        i, j = self.cube._span(lo, hi)
+        columns = list(METRICS)
+        index = pd.Index(self.cube.countries[codes], name="country")
+        if j <= i or len(codes) == 0:
+            return pd.DataFrame(index=index[:0], columns=columns, dtype="float64")
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            # the first year of the range has no change inside the range
+            n = self.change_n[codes, j] - self.change_n[codes, i + 1]
+            change = (self.change[codes, j] - self.change[codes, i + 1]) / n
+            gap = (self.gap[codes, j] - self.gap[codes, i]) / (self.gap_n[codes, j] - self.gap_n[codes, i])
+
+            treated = self.treated[codes, i:j]
+            positive = np.nan_to_num(treated) > 0
+            first = positive.argmax(axis=1)
+            last = positive.shape[1] - 1 - positive[:, ::-1].argmax(axis=1)
+            rows = np.arange(len(codes))
+            span = np.where(positive.any(axis=1) & (last > first), last - first, np.nan)
+            # 1 ** nan is 1, so the mask has to go on the result
+            cagr = np.where(np.isnan(span), np.nan, ((treated[rows, last] / treated[rows, first]) ** (1 / span) - 1) * 100)
+
+        # runs that started before the range are cut at its first year
+        streak = np.minimum(self.streak[codes, i:j], np.arange(1, j - i + 1)).max(axis=1)
+        values = np.column_stack([change, cagr, self.rank[codes, j - 1], streak, gap])
+        return pd.DataFrame(values, index=index, columns=columns)
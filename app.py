@@ -1,6 +1,6 @@
 import streamlit as st
+import datasets
 from multiapp import MultiApp
-import lf, sth, about # import your app modules here
 
 st.set_page_config(page_title="LF & STH Data Explorer", page_icon="💾",
                    layout="wide", initial_sidebar_state="expanded")
@@ -30,11 +30,12 @@ st.markdown(hide_menu,unsafe_allow_html=True)
 app = MultiApp()
 
 
-# Add all your application here
+# Add all your application here, by module so pages are imported on first use,
+# and a disease page for every dataset spec in specs/
 with st.sidebar:
-    app.add_app("About", about.app)
-    app.add_app("Soil Transmitted Helminthiasis", sth.app)
-    app.add_app("Lymphatic Filariasis", lf.app)
+    app.add_app("About", "about")
+    for name in datasets.names():
+        app.add_spec(name)
 
 # The main app
 app.run()
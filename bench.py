@@ -0,0 +1,326 @@
+"""Headless benchmarks for the disease pages.
+
+Runs `engine.app(name)` for each dataset against a recording stand-in for the
+`streamlit` module, so no browser, server or network is involved. Widgets
+return the scenario's selection and the form is always submitted; charts and
+tables are serialized the way streamlit would so their cost is counted.
+
+    python bench.py                      # run all scenarios, print a report
+    python bench.py --save               # ... and store it as the baseline
+    python bench.py --compare            # fail if slower than the baseline
+    python bench.py -s all_countries -n 50
+
+Baselines are machine specific, so save one on the machine you compare on.
+Unless NTD_CACHE / NTD_MAP_STORE are set, the shared cache and the map store
+live in temporary directories so runs don't reuse each other's results.
+
+Scenarios
+---------
+cold_start       fresh interpreter with no shared cache or map store: import the page and
+                 run one Fetch
+default          the page's default selection, caches warm
+all_countries    every country over the full year range, caches warm
+all_uncached     the same with the figure cache cleared and the shared cache
+                 and map store turned off
+concurrent       `--sessions` simulated sessions fetching at the same time
+"""
+import argparse
+import contextlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import datasets
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BASELINE = os.path.join(HERE, "bench_baseline.json")
+PAGES = datasets.names()
+
+
+class _Element:
+    """Anything streamlit hands back: columns, expanders, forms, placeholders."""
+    def __init__(self, recorder):
+        self._recorder = recorder
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __getattr__(self, name):
+        return getattr(self._recorder, name)
+
+
+class _Recorder(threading.local):
+    """The stand-in `streamlit` module; one set of widget values per thread.
+
+    Every output call is recorded as (name, payload bytes) in `calls`.
+    """
+    def __init__(self):
+        self.selection = {}
+        self.calls = []
+        self.session_state = {}
+
+    # widgets ------------------------------------------------------------
+    def multiselect(self, label, options, default=None, **kwargs):
+        return self.selection.get("countries" if label == "Select countries" else label, default)
+
+    def select_slider(self, label, options=None, value=None, **kwargs):
+        return self.selection.get("years", value)
+
+    def selectbox(self, label, options, *args, **kwargs):
+        return self.selection.get(label, options[0])
+
+    def checkbox(self, label, value=False, **kwargs):
+        return self.selection.get(label, value)
+
+    def number_input(self, label, min_value=None, max_value=None, value=None, *args, **kwargs):
+        return self.selection.get(label.split(" (")[0], value if value is not None else min_value)
+
+    def form_submit_button(self, *args, **kwargs):
+        return True
+
+    def experimental_get_query_params(self):
+        return {}
+
+    # layout -------------------------------------------------------------
+    def columns(self, spec, **kwargs):
+        return [_Element(self) for _ in range(spec if isinstance(spec, int) else len(spec))]
+
+    def form(self, *args, **kwargs):
+        return _Element(self)
+
+    expander = container = empty = form
+
+    @property
+    def sidebar(self):
+        return _Element(self)
+
+    # output -------------------------------------------------------------
+    def _record(self, name, payload=""):
+        self.calls.append((name, len(payload)))
+
+    def plotly_chart(self, fig, **kwargs):
+        import plotly.utils
+        self._record("plotly_chart", json.dumps(fig, cls=plotly.utils.PlotlyJSONEncoder))
+
+    def table(self, data=None, **kwargs):
+        self._record("table", getattr(data, "to_html", lambda: str(data))())
+
+    dataframe = table
+
+    def html(self, body, **kwargs):
+        self._record("html", body)
+
+    def write(self, *args, **kwargs):
+        self._record("write", "".join(getattr(a, "to_html", lambda: str(a))() for a in args))
+
+    def markdown(self, body="", **kwargs):
+        self._record("markdown", str(body))
+
+    title = header = subheader = caption = info = warning = error = success = text = exception = markdown
+
+    def json(self, body, **kwargs):
+        self._record("json", json.dumps(body, default=str))
+
+    def cache(self, func=None, **kwargs):
+        """memoizes per process, like st.cache does for one worker"""
+        if func is None:
+            return lambda f: self.cache(f, **kwargs)
+        memo = {}
+        lock = threading.Lock()
+
+        def wrapper(*args):
+            with lock:
+                if args not in memo:
+                    memo[args] = func(*args)
+                return memo[args]
+        return wrapper
+
+    singleton = experimental_singleton = experimental_memo = cache
+
+
+st = _Recorder()
+
+
+def install():
+    """Puts the recording module in place of streamlit."""
+    module = types.ModuleType("streamlit")
+    module.__getattr__ = lambda name: getattr(st, name)
+    components = types.ModuleType("streamlit.components.v1")
+    components.html = lambda html, **kwargs: st.html(html)
+    module.components = types.SimpleNamespace(v1=components)
+    sys.modules.update({"streamlit": module, "streamlit.components": module.components,
+                        "streamlit.components.v1": components})
+
+
+# selection per scenario ------------------------------------------------------
+
+def _everything(page):
+    import datastore
+    df = datastore.load(page)
+    return {"countries": df.index.unique().tolist(), "years": (int(df.year.min()), int(df.year.max()))}
+
+
+def _selection(page, scenario):
+    return _everything(page) if scenario.startswith("all") else {}
+
+
+def _run(page, selection, uncached=False):
+    import figcache
+    import maps
+    import sharedcache
+    import engine
+    st.selection = selection
+    st.calls = []
+    shared, store = sharedcache.cache, maps.STORE
+    if uncached:
+        figcache.cache.clear()
+        sharedcache.cache = sharedcache.NullCache()
+        maps.STORE = "none"
+    try:
+        start = time.perf_counter()
+        engine.app(page)
+        return time.perf_counter() - start, sum(size for _, size in st.calls)
+    finally:
+        sharedcache.cache, maps.STORE = shared, store
+
+
+@contextlib.contextmanager
+def _traced():
+    tracemalloc.start()
+    peak = {}
+    try:
+        yield peak
+    finally:
+        peak["bytes"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+
+def _summary(latencies, payload, peak):
+    ms = np.array(latencies) * 1000
+    return {"runs": len(ms), "p50_ms": round(float(np.percentile(ms, 50)), 2),
+            "p90_ms": round(float(np.percentile(ms, 90)), 2),
+            "p99_ms": round(float(np.percentile(ms, 99)), 2),
+            "max_ms": round(float(ms.max()), 2),
+            "payload_kb": round(payload / 1024, 1), "peak_mb": round(peak / (1 << 20), 1)}
+
+
+def cold_start(page, runs):
+    """import + first Fetch, each in a fresh interpreter"""
+    code = ("import resource, sys, time; sys.path.insert(0, {here!r}); import bench; bench.install(); "
+            "t = time.perf_counter(); _, size = bench._run({page!r}, {{}}); "
+            "print(time.perf_counter() - t, size, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)")
+    latencies, peak = [], 0
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", code.format(here=HERE, page=page)],
+                             check=True, capture_output=True, text=True, cwd=HERE,
+                             env=dict(os.environ, NTD_CACHE="none", NTD_MAP_STORE="none"))
+        seconds, payload, rss = out.stdout.split()[-3:]
+        latencies.append(float(seconds))
+        peak = max(peak, int(rss) * 1024)  # peak RSS of the whole process
+    return _summary(latencies, int(payload), peak)
+
+
+def warm(page, scenario, runs):
+    selection = _selection(page, scenario)
+    uncached = scenario == "all_uncached"
+    _run(page, selection)  # warm up imports and caches
+    latencies = [_run(page, selection, uncached)[0] for _ in range(runs)]
+    with _traced() as peak:
+        _, payload = _run(page, selection, uncached)
+    return _summary(latencies, payload, peak["bytes"])
+
+
+def concurrent(page, runs, sessions):
+    """`sessions` threads, each fetching `runs` times; half default, half everything"""
+    everything = _selection(page, "all")
+    _run(page, everything)
+
+    def session(i, runs):
+        selection = everything if i % 2 else {}
+        return [_run(page, selection)[0] for _ in range(runs)]
+
+    def fetch_all(runs):
+        with ThreadPoolExecutor(sessions) as pool:
+            return [t for ts in pool.map(session, range(sessions), [runs] * sessions) for t in ts]
+
+    latencies = fetch_all(runs)
+    with _traced() as peak:  # tracing is slow, so only for one round
+        fetch_all(1)
+    return _summary(latencies, 0, peak["bytes"])
+
+
+SCENARIOS = ["cold_start", "default", "all_countries", "all_uncached", "concurrent"]
+
+
+def run(pages, scenarios, runs, sessions):
+    results = {}
+    for page in pages:
+        for scenario in scenarios:
+            if scenario == "cold_start":
+                result = cold_start(page, max(1, runs // 10))
+            elif scenario == "concurrent":
+                result = concurrent(page, max(1, runs // sessions), sessions)
+            else:
+                result = warm(page, scenario, runs)
+            results["{}/{}".format(page, scenario)] = result
+            print("{:<22} {}".format(page + "/" + scenario, result), flush=True)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Returns the scenarios whose p50 got more than `tolerance` slower."""
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        before, after = baseline[name]["p50_ms"], result["p50_ms"]
+        if after > before * (1 + tolerance):
+            regressions.append("{}: p50 {} ms -> {} ms".format(name, before, after))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-p", "--page", action="append", choices=PAGES)
+    parser.add_argument("-s", "--scenario", action="append", choices=SCENARIOS)
+    parser.add_argument("-n", "--runs", type=int, default=20)
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--save", action="store_true", help="store the results as the baseline")
+    parser.add_argument("--compare", action="store_true", help="exit 1 if slower than the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed p50 slowdown, default 25%%")
+    parser.add_argument("--baseline", default=BASELINE)
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault("NTD_CACHE", "disk:" + tempfile.mkdtemp(prefix="ntd-bench-"))
+    os.environ.setdefault("NTD_MAP_STORE", tempfile.mkdtemp(prefix="ntd-bench-maps-"))
+    install()
+    sys.path.insert(0, HERE)
+    results = run(args.page or PAGES, args.scenario or SCENARIOS, args.runs, args.sessions)
+
+    if args.compare and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print("REGRESSION " + line)
+        if regressions:
+            return 1
+    if args.save:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,60 @@
+"""Chart helpers for large country selections.
+
+The page charts draw one trace per country, so their payload and the time the
+browser needs to draw them grow with every country picked, and past a dozen
+lines they are hard to read anyway. In the aggregate mode the pages draw
+`Cube.bands` instead: the regional total for counts and the median with its
+interquartile range for coverages, one point per year whatever the selection.
+Per-country charts of more than THRESHOLD countries use WebGL traces.
+
+Set NTD_CHART_THRESHOLD to change the threshold (default 12).
+"""
+import os
+
+import plotly.graph_objects as go
+
+THRESHOLD = int(os.environ.get("NTD_CHART_THRESHOLD", 12))
+
+# choices of the "Charts" sidebar option
+MODES = ["Auto", "Per country", "Aggregate"]
+
+MARGIN = {"r": 0, "t": 50, "l": 0, "b": 100}
+
+
+def aggregated(mode, countries):
+    """whether the charts for this selection should be summaries"""
+    return mode == MODES[2] or (mode == MODES[0] and len(countries) > THRESHOLD)
+
+
+def render_mode(countries, small="auto"):
+    """plotly express render_mode: WebGL for many countries, `small` otherwise"""
+    return "webgl" if len(countries) > THRESHOLD else small
+
+
+def total(bands, metric, title):
+    """area chart of the yearly sum over the selected countries"""
+    stats = bands[metric]
+    fig = go.Figure(go.Scatter(
+        x=stats.index, y=stats["total"], mode="lines+markers", fill="tozeroy", name="total",
+        customdata=stats["countries"],
+        hovertemplate="%{x}: %{y:,.0f}<br>%{customdata:.0f} countries reporting<extra></extra>"))
+    fig.update_layout(title=title, xaxis_title="year", yaxis_title=metric, margin=MARGIN)
+    return fig
+
+
+def band(bands, metric, title):
+    """median line with the interquartile range shaded around it"""
+    stats = bands[metric]
+    fig = go.Figure([
+        go.Scatter(x=stats.index, y=stats["p75"], mode="lines", line={"width": 0},
+                   showlegend=False, hoverinfo="skip"),
+        go.Scatter(x=stats.index, y=stats["p25"], mode="lines", line={"width": 0},
+                   fill="tonexty", fillcolor="rgba(99, 110, 250, 0.25)",
+                   name="25th to 75th percentile", hoverinfo="skip"),
+        go.Scatter(x=stats.index, y=stats["median"], mode="lines+markers", name="median",
+                   line={"color": "rgb(99, 110, 250)"}, customdata=stats[["p25", "p75", "countries"]],
+                   hovertemplate="%{x}: median %{y:.1f}<br>IQR %{customdata[0]:.1f} to %{customdata[1]:.1f}"
+                                 "<br>%{customdata[2]:.0f} countries reporting<extra></extra>"),
+    ])
+    fig.update_layout(title=title, xaxis_title="year", yaxis_title=metric, margin=MARGIN)
+    return fig
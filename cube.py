@@ -0,0 +1,156 @@
+"""Dense country x year x metric cube over a cleaned dataset.
+
+Every Fetch used to filter the frame with `df.loc[nation]` plus `isin` and then
+run a groupby for the map and again for the table. The cube does that work
+once per snapshot: countries get integer codes, the numeric columns are summed
+into a (country, year, metric) array and prefix sums are taken along the year
+axis. A range total or mean for any set of countries is then a couple of
+fancy-indexing operations, and the raw rows for the charts are contiguous
+blocks of a frame sorted by (country, year).
+
+Year ranges follow `range` semantics, i.e. `lo` is included and `hi` is not,
+matching the `isin(range(year[0], year[-1]))` filter the pages always used.
+"""
+import hashlib
+import warnings
+
+import numpy as np
+import pandas as pd
+
+
+class Cube:
+    """Precomputed aggregates for one cleaned dataset.
+
+    Parameters
+    ----------
+    df:
+        a cleaned frame indexed by country with a `year` column, as returned by
+        `datastore.load`.
+    version:
+        the snapshot version of `df` (see `datastore.version`), used to key
+        anything cached from this cube.
+    digests:
+        {country: digest} of the snapshot (see `datastore.country_digests`);
+        when given, `version_of` keys a selection on its countries only.
+    """
+    def __init__(self, df, version=None, digests=None):
+        self.version = version
+        self.digests = digests
+        names = df.index.astype(str)
+        self.countries = np.unique(names)  # sorted, like groupby
+        self.code = {name: i for i, name in enumerate(self.countries)}
+        self.metrics = df.select_dtypes("number").columns.drop("year")
+        self.years = np.arange(df["year"].min(), df["year"].max() + 1)
+
+        c = np.searchsorted(self.countries, names)
+        y = df["year"].to_numpy() - self.years[0]
+        n_c, n_y = len(self.countries), len(self.years)
+
+        # rows sorted by (country, year), keeping the workbook order within a year
+        order = np.lexsort((y, c))
+        self.frame = df.iloc[order]
+
+        sums = np.zeros((n_c, n_y, len(self.metrics)))
+        np.add.at(sums, (c, y), df[self.metrics].to_numpy(dtype="float64"))
+        counts = np.zeros((n_c, n_y), dtype=np.int64)
+        np.add.at(counts, (c, y), 1)
+
+        # prefix sums along the year axis with a leading zero slot so that the
+        # total over years [i, j) is simply S[:, j] - S[:, i]
+        self.sums = np.zeros((n_c, n_y + 1, len(self.metrics)))
+        self.sums[:, 1:] = sums.cumsum(axis=1)
+        self.counts = np.zeros((n_c, n_y + 1), dtype=np.int64)
+        self.counts[:, 1:] = counts.cumsum(axis=1)
+
+        # position of the first row of every country in the sorted frame
+        self.offsets = np.zeros(n_c + 1, dtype=np.int64)
+        self.offsets[1:] = self.counts[:, -1].cumsum()
+
+    def version_of(self, countries):
+        """Version of just the selected countries' rows, for cache keys.
+
+        Ingesting rows for other countries leaves it unchanged, so their
+        cached figures and maps stay valid.
+        """
+        if self.digests is None:
+            return self.version
+        parts = sorted("{}={}".format(c, self.digests.get(c, "")) for c in set(countries))
+        return hashlib.sha256("|".join(parts).encode()).hexdigest()[:16]
+
+    def codes(self, countries):
+        """integer codes for the known countries, in selection order"""
+        return np.array([self.code[name] for name in countries if name in self.code], dtype=np.int64)
+
+    def _span(self, lo, hi):
+        y0, n_y = self.years[0], len(self.years)
+        return int(np.clip(lo - y0, 0, n_y)), int(np.clip(hi - y0, 0, n_y))
+
+    def rows(self, countries, lo, hi):
+        """Raw rows for the selection, in selection order, for the charts."""
+        codes = self.codes(countries)
+        if len(codes) == 0:
+            return self.frame.iloc[:0]
+        i, j = self._span(lo, hi)
+        starts = self.offsets[codes] + self.counts[codes, i]
+        stops = self.offsets[codes] + self.counts[codes, j]
+        idx = np.concatenate([np.arange(a, b) for a, b in zip(starts, stops)])
+        rows = self.frame.iloc[idx]
+        if hasattr(rows.index, "remove_unused_categories"):
+            # so groupbys and plotly only see the selected countries
+            rows.index = rows.index.remove_unused_categories()
+        return rows
+
+    def _aggregate(self, countries, lo, hi):
+        codes = np.sort(self.codes(countries))
+        i, j = self._span(lo, hi)
+        totals = self.sums[codes, j] - self.sums[codes, i]
+        counts = self.counts[codes, j] - self.counts[codes, i]
+        present = counts > 0  # groupby drops countries without rows
+        return codes[present], totals[present], counts[present]
+
+    def _frame(self, codes, values):
+        index = pd.Index(self.countries[codes], name="country")
+        return pd.DataFrame(values, index=index, columns=self.metrics)
+
+    def yearly(self, countries, lo, hi):
+        """(years, means) for the selection, where means[c, y, m] is the mean of
+        metric m over country c's rows in year y, NaN when it has none."""
+        codes = np.sort(self.codes(countries))
+        i, j = self._span(lo, hi)
+        sums = np.diff(self.sums[codes, i:j + 1], axis=1)
+        counts = np.diff(self.counts[codes, i:j + 1], axis=1)[..., None]
+        means = np.full(sums.shape, np.nan)
+        np.divide(sums, counts, out=means, where=counts > 0)
+        return self.years[i:j], means
+
+    def bands(self, countries, lo, hi):
+        """Per-year summary across the selected countries over [lo, hi).
+
+        Returns a frame indexed by year with a (metric, stat) column for each
+        stat: `total` (sum of the country means), `p25`, `median`, `p75` and
+        `countries` (how many reported that year). Its size only depends on
+        the number of years, not on how many countries were selected.
+        """
+        years, means = self.yearly(countries, lo, hi)
+        reported = (~np.isnan(means)).sum(axis=0)
+        stats = {"total": np.nansum(means, axis=0), "countries": reported}
+        if means.size:  # no countries or no years in the span: all NaN
+            with warnings.catch_warnings():  # years nobody reported stay NaN
+                warnings.simplefilter("ignore", RuntimeWarning)
+                stats["p25"], stats["median"], stats["p75"] = np.nanpercentile(means, [25, 50, 75], axis=0)
+        else:
+            stats["p25"] = stats["median"] = stats["p75"] = np.full(reported.shape, np.nan)
+        order = ["total", "p25", "median", "p75", "countries"]
+        columns = pd.MultiIndex.from_product([self.metrics, order])
+        values = np.stack([stats[name] for name in order], axis=-1).reshape(len(years), len(columns))
+        return pd.DataFrame(values, index=pd.Index(years, name="year"), columns=columns)
+
+    def totals(self, countries, lo, hi):
+        """Per-country sums over the years [lo, hi)."""
+        codes, totals, _ = self._aggregate(countries, lo, hi)
+        return self._frame(codes, totals)
+
+    def means(self, countries, lo, hi):
+        """Per-country means over the years [lo, hi), like groupby("country").mean()."""
+        codes, totals, counts = self._aggregate(countries, lo, hi)
+        return self._frame(codes, totals / counts[:, None])
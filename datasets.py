@@ -0,0 +1,121 @@
+"""Dataset specs: what a disease page is made of.
+
+Each NTD dataset is described by a JSON file in specs/, named after the
+dataset ("lf", "sth"). The spec says how to clean the WHO workbook (the
+source, the columns to drop, the rate columns and which of them to scale to
+percentages) and what the page shows: the metric groups, the charts, the map
+and the glossary. `datastore` cleans every dataset that has a spec and
+`engine` turns a spec into a page, so adding a dataset is adding a spec:
+
+    {
+      "title": "Lymphatic Filariasis",
+      "source": "LF_data.xlsx",
+      "drop": ["country_code", "region", ...],
+      "rates": ["National coverage", ...],
+      "percent": ["National coverage", ...],
+      "target": 65,
+      "groups": [{"label": "", "metrics": {"required": ..., "treated": ..., "coverage": ...}}],
+      "charts": [{"metric": "coverage", "kind": "line", "title": ..., "aggregate_title": ...}],
+      "map": {"kind": "choropleth", "caption": ...},
+      ...
+    }
+
+A metric group is one population of the dataset (the whole population for
+LF, pre-school and school aged children for STH). When there are several,
+each has a short `key` for the query API ("psa", "sac"). A group names its
+columns by role: `required`, `treated` and `coverage` are needed for the
+analytics, any other role can be used by the charts. Titles and captions are
+formatted with {first} and {last}, the selected years.
+"""
+import hashlib
+import json
+import os
+from functools import lru_cache
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SPEC_DIR = os.path.join(HERE, "specs")
+
+# roles every metric group needs, see analytics.Analytics
+ROLES = ["required", "treated", "coverage"]
+CHART_KINDS = ["line", "area", "scatter"]
+MAP_KINDS = ["choropleth", "bubbles"]
+
+# the fields that change the cleaned data; the snapshots are rebuilt when they do
+CLEANING = ["source", "region", "drop", "categories", "rates", "percent"]
+
+
+class Spec:
+    """One dataset and its page.
+
+    Parameters
+    ----------
+    name:
+        the dataset name, as used by `datastore` and in cache keys.
+    fields:
+        the parsed spec file, see the module docstring.
+    """
+    def __init__(self, name, fields):
+        self.name = name
+        self.fields = fields
+        self.title = fields["title"]
+        self.source = os.path.join(HERE, fields["source"])
+        self.region = fields.get("region", "AFR")
+        self.drop = fields.get("drop", [])
+        self.categories = fields.get("categories", {})  # column -> value for missing entries
+        self.rates = fields.get("rates", [])
+        self.percent = fields.get("percent", [])  # rates given as fractions, scaled to %
+        self.target = fields["target"]
+        self.countries = fields["defaults"]["countries"]
+        self.years = tuple(fields["defaults"]["years"])
+        self.groups = {group["label"]: group["metrics"] for group in fields["groups"]}
+        self.group_keys = {group["key"]: group["label"] for group in fields["groups"] if "key" in group}
+        self.group_heading = fields.get("group_heading", "{}")
+        self.charts = fields["charts"]
+        self.map = fields["map"]
+        self.raw_data = fields.get("raw_data")  # label of the raw data view, if the page has one
+        self.glossary = fields.get("glossary", [])
+        self.digest = hashlib.sha256(json.dumps([fields.get(k) for k in CLEANING]).encode()).hexdigest()[:16]
+
+    def metrics(self, group):
+        """{role: column} of a metric group"""
+        return self.groups[group]
+
+    def columns(self, group):
+        """the columns of a metric group, in spec order"""
+        return list(self.groups[group].values())
+
+    def target_percent(self, group):
+        """the WHO coverage target in %, whatever the unit of the coverage column"""
+        return self.target if self.metrics(group)["coverage"] in self.percent else self.target * 100
+
+
+def _check(spec, path):
+    """fails early on a spec the page couldn't draw"""
+    problems = []
+    for label, metrics in spec.groups.items():
+        problems += ["group {!r} has no {!r} metric".format(label, role) for role in ROLES if role not in metrics]
+        problems += ["chart {!r} uses {!r}, which group {!r} doesn't have".format(c["title"], c["metric"], label)
+                     for c in spec.charts if c["metric"] not in metrics]
+    if len(spec.groups) > 1 and len(spec.group_keys) < len(spec.groups):
+        problems.append("every group needs a distinct key when there are several")
+    problems += ["chart {!r} has unknown kind {!r}".format(c["title"], c["kind"])
+                 for c in spec.charts if c["kind"] not in CHART_KINDS]
+    if spec.map["kind"] not in MAP_KINDS:
+        problems.append("unknown map kind {!r}".format(spec.map["kind"]))
+    if problems:
+        raise ValueError("{}: {}".format(path, "; ".join(problems)))
+
+
+@lru_cache(maxsize=None)
+def load(name):
+    """Returns the Spec of a dataset, read from specs/<name>.json."""
+    path = os.path.join(SPEC_DIR, name + ".json")
+    with open(path, encoding="utf-8") as f:
+        spec = Spec(name, json.load(f))
+    _check(spec, path)
+    return spec
+
+
+def names():
+    """the datasets that have a spec, sorted"""
+    return sorted(f[:-5] for f in os.listdir(SPEC_DIR) if f.endswith(".json"))
@@ -0,0 +1,299 @@
+"""Columnar snapshots of the WHO workbooks.
+
+Parsing the Excel files with openpyxl is slow, so every workbook is cleaned once
+and stored as a Parquet snapshot under .snapshots/. The snapshot is reused by
+every process until the workbook's mtime changes *and* its content hash no
+longer matches. Snapshots can be prebuilt before deploying with:
+
+    python datastore.py
+
+A WHO data-bank refresh usually adds a single reporting year. Rather than
+replacing the workbook, the new rows can be ingested on their own from a CSV,
+Excel or Parquet file with the workbook's columns:
+
+    python datastore.py --ingest lf LF_2020.csv
+
+Only the new rows are parsed and cleaned. They replace any rows the snapshot
+already had for the same (country, year) and every other row is kept as is.
+The snapshot keeps a digest per country (see `country_digests`), so caches
+keyed on it only lose the entries of the countries the new rows touched. A
+changed workbook still rebuilds the snapshot from scratch, dropping the
+ingested rows, since a WHO workbook already holds every year it covers.
+
+How a workbook is cleaned comes from its dataset spec (see datasets.py), so
+editing the cleaning fields of a spec rebuilds the snapshot as well.
+"""
+import argparse
+import hashlib
+import json
+import os
+import threading
+
+import pandas as pd
+
+import datasets
+from cube import Cube
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SNAPSHOT_DIR = os.path.join(HERE, ".snapshots")
+
+# bump this whenever `clean` changes so old snapshots get rebuilt
+SCHEMA = 4
+
+
+def compact(df, rates, categories=()):
+    """Shrinks a cleaned frame to the smallest types that keep its values.
+
+    The country index and the `categories` columns become categoricals, years
+    int16 and the `rates` (percentages) float32. Every other column is a count:
+    it gets the smallest unsigned integer type when all its values are whole
+    numbers, and stays float64 otherwise so counts are never rounded.
+    """
+    df = df.copy()
+    df.index = df.index.astype("category")
+    for col in categories:
+        df[col] = df[col].astype("category")
+    df["year"] = df["year"].astype("int16")
+    df[rates] = df[rates].astype("float32")
+    for col in df.columns.drop(["year", *rates, *categories]):
+        if (df[col] % 1 == 0).all() and (df[col] >= 0).all():
+            df[col] = pd.to_numeric(df[col].astype("int64"), downcast="unsigned")
+    return df
+
+
+def clean(df, spec):
+    """WHO workbook -> cleaned frame indexed by country, as the dataset spec says"""
+    df = df[df["region"] == spec.region]  # get rid of the other regions
+    df = df.drop(spec.drop, axis=1)  # get rid of these columns
+    # converting relevant columns into numberic
+    cols = df.columns.drop(["country", "year", *spec.categories])
+    df[cols] = df[cols].apply(pd.to_numeric, errors="coerce")
+    for col, missing in spec.categories.items():
+        df[col] = df[col].fillna(missing)
+    df = df.fillna(0)  # replace all na values with 0
+    df = df.set_index("country")
+    df[spec.percent] = df[spec.percent].transform(lambda x: x * 100)
+    return compact(df, rates=spec.rates, categories=list(spec.categories))
+
+
+# dataset name -> spec, one per file in specs/
+DATASETS = {name: datasets.load(name) for name in datasets.names()}
+
+
+def _digest(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _country_digests(df):
+    """{country: digest of its rows}, to tell which countries a change touched"""
+    rows = pd.util.hash_pandas_object(df.reset_index(), index=False).to_numpy()
+    names = df.index.astype(str).to_numpy()
+    digests = {}
+    for name in pd.unique(names):
+        digests[name] = hashlib.sha256(rows[names == name].tobytes()).hexdigest()[:16]
+    return digests
+
+
+def _country_codes(raw, countries):
+    """{country: WHO country code} for the given countries.
+
+    The workbooks have the odd wrong or missing code on a single row (one
+    Ghana row is coded as Guinea), so each country gets its most common one.
+    """
+    raw = raw[raw["country"].isin(countries)].dropna(subset=["country_code"])
+    codes = raw.groupby("country")["country_code"].agg(lambda c: c.str.upper().mode().iloc[0])
+    return codes.to_dict()
+
+
+def _paths(name):
+    base = os.path.join(SNAPSHOT_DIR, name)
+    return base + ".parquet", base + ".json"
+
+
+def _read_meta(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_atomic(path, write):
+    """writes through a temp file so readers never see a half written snapshot"""
+    # sessions are threads of one process, so the pid alone isn't unique
+    tmp = "{}.{}.{}.tmp".format(path, os.getpid(), threading.get_ident())
+    try:
+        write(tmp)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def _write_meta(path, meta):
+    def write(tmp):
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+    _write_atomic(path, write)
+
+
+def build(name):
+    """Re-reads the source workbook and writes a fresh snapshot."""
+    spec = DATASETS[name]
+    snapshot, meta_path = _paths(name)
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    stat = os.stat(spec.source)
+    digest = _digest(spec.source)
+    raw = pd.read_excel(spec.source)
+    df = clean(raw, spec)
+    _write_atomic(snapshot, lambda tmp: df.to_parquet(tmp))
+    _write_meta(meta_path, {"schema": SCHEMA, "spec": spec.digest, "sha256": digest, "version": digest[:16],
+                            "mtime": stat.st_mtime_ns, "size": stat.st_size,
+                            "columns": raw.columns.tolist(), "countries": _country_digests(df),
+                            "codes": _country_codes(raw, df.index.unique()), "ingested": []})
+    return df
+
+
+def _read_rows(path):
+    """the raw rows of a delta file, read like the workbooks are"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        return pd.read_csv(path)
+    if ext == ".parquet":
+        return pd.read_parquet(path)
+    if ext in (".xlsx", ".xls"):
+        return pd.read_excel(path)
+    raise ValueError("can't read {}: expected .csv, .parquet or .xlsx".format(path))
+
+
+def _validate(raw, columns, path):
+    """checks the delta has exactly the workbook's columns and usable keys"""
+    missing = [c for c in columns if c not in raw.columns]
+    unexpected = [c for c in raw.columns if c not in columns]
+    if missing or unexpected:
+        raise ValueError("{} doesn't match the workbook: missing {}, unexpected {}".format(
+            path, missing, unexpected))
+    if raw["country"].isna().any():
+        raise ValueError("{} has rows without a country".format(path))
+    years = pd.to_numeric(raw["year"], errors="coerce")
+    if years.isna().any() or (years % 1 != 0).any():
+        raise ValueError("{} has rows without a valid year".format(path))
+    return raw[columns].astype({"year": "int64"})
+
+
+def ingest(name, path):
+    """Adds the rows of a delta file to the snapshot of a dataset.
+
+    Parameters
+    ----------
+    name:
+        a key of DATASETS, e.g. "lf" or "sth".
+    path:
+        CSV, Parquet or Excel file with the same columns as the workbook.
+
+    Returns the countries whose rows changed; ingesting a file twice is a no-op.
+    """
+    snapshot, meta_path = _paths(name)
+    df = load(name)
+    meta = _read_meta(meta_path)
+    digest = _digest(path)
+    if digest in meta["ingested"]:
+        return []
+
+    raw = _validate(_read_rows(path), meta["columns"], path)
+    new = clean(raw, DATASETS[name])
+    # new rows replace whatever the snapshot had for the same country and year
+    keys = pd.MultiIndex.from_arrays([new.index.astype(str), new["year"]])
+    old = pd.MultiIndex.from_arrays([df.index.astype(str), df["year"]])
+    merged = pd.concat([df[~old.isin(keys)], new])
+    # concat widens mismatched types, so shrink them again like clean did
+    rates = merged.columns[merged.dtypes == "float32"].tolist()
+    categories = [c for c in merged.columns if c in df.columns and df[c].dtype == "category"]
+    merged = compact(merged.astype({c: "object" for c in categories}), rates, categories)
+
+    changed = sorted(set(new.index.astype(str)))
+    _write_atomic(snapshot, lambda tmp: merged.to_parquet(tmp))
+    meta["countries"].update(_country_digests(merged.loc[merged.index.isin(changed)]))
+    meta["codes"].update(_country_codes(raw, changed))
+    meta["ingested"].append(digest)
+    meta["version"] = hashlib.sha256((meta["version"] + digest).encode()).hexdigest()[:16]
+    _write_meta(meta_path, meta)
+    return changed
+
+
+def _is_fresh(name):
+    source = DATASETS[name].source
+    snapshot, meta_path = _paths(name)
+    meta = _read_meta(meta_path)
+    if meta is None or meta.get("schema") != SCHEMA or not os.path.exists(snapshot):
+        return False
+    if meta.get("spec") != DATASETS[name].digest:  # cleaned differently now
+        return False
+    stat = os.stat(source)
+    if meta["mtime"] == stat.st_mtime_ns and meta["size"] == stat.st_size:
+        return True
+    # touched but maybe not changed, e.g. a fresh checkout
+    if _digest(source) != meta["sha256"]:
+        return False
+    meta.update(mtime=stat.st_mtime_ns, size=stat.st_size)
+    _write_meta(meta_path, meta)
+    return True
+
+
+def load(name):
+    """Returns the cleaned frame for a dataset, rebuilding its snapshot if stale.
+
+    Parameters
+    ----------
+    name:
+        a key of DATASETS, e.g. "lf" or "sth".
+    """
+    if not _is_fresh(name):
+        return build(name)
+    return pd.read_parquet(_paths(name)[0])
+
+
+def version(name):
+    """Identifies the snapshot content, handy as part of cache keys."""
+    if not _is_fresh(name):
+        build(name)
+    meta = _read_meta(_paths(name)[1])
+    return "{}-{}".format(meta["schema"], meta["version"])
+
+
+def country_digests(name):
+    """{country: digest of its rows} for the current snapshot of a dataset"""
+    if not _is_fresh(name):
+        build(name)
+    return _read_meta(_paths(name)[1])["countries"]
+
+
+def country_codes(name):
+    """{country: upper case WHO (ISO 3166 alpha-3) code} for a dataset"""
+    if not _is_fresh(name):
+        build(name)
+    return _read_meta(_paths(name)[1])["codes"]
+
+
+def cube(name):
+    """the Cube of the current snapshot of a dataset, with its version and country digests"""
+    return Cube(load(name), version(name), country_digests(name))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or update the dataset snapshots.")
+    parser.add_argument("--ingest", nargs=2, metavar=("DATASET", "FILE"),
+                        help="add the rows of FILE to the snapshot of DATASET")
+    args = parser.parse_args()
+    if args.ingest:
+        name, path = args.ingest
+        changed = ingest(name, path)
+        print("{}: {} countries updated{}".format(name, len(changed), ": " + ", ".join(changed) if changed else ""))
+    else:
+        for name in DATASETS:
+            df = build(name)
+            print("{}: {} rows -> {}".format(name, len(df), _paths(name)[0]))
@@ -0,0 +1,45 @@
+"""Paginated, column-projected views of a frame.
+
+`st.table` and `st.write` serialize every row of the frame they get, on every
+run, even inside a closed expander. `show` only sends the rows of the page
+being looked at, in the columns picked, and a lazy view sends nothing at all
+until its checkbox is ticked. The frame passed in is the slice the page has
+already computed, so paging never recomputes it.
+"""
+import os
+
+import streamlit as st
+
+PAGE_SIZE = int(os.environ.get("NTD_PAGE_SIZE", 25))
+
+
+def show(df, key, label="Show data", columns=None, lazy=False, page_size=PAGE_SIZE):
+    """Shows `df` one page at a time and returns the rows shown.
+
+    Parameters
+    ----------
+    key:
+        prefix for the widget keys, unique on the page.
+    label:
+        text of the checkbox that opens a lazy view.
+    columns:
+        columns shown at first; the user can pick any of `df.columns`.
+    lazy:
+        only show (and serialize) the data once the user asks for it.
+    """
+    if lazy and not st.checkbox(label, key=key + "-open"):
+        return df.iloc[:0]
+    columns = st.multiselect("Columns", list(df.columns), list(columns if columns is not None else df.columns),
+                             key=key + "-columns")
+    pages = max(1, -(-len(df) // page_size))
+    page = 1
+    if pages > 1:
+        # a smaller selection can leave the remembered page past the end
+        if st.session_state.get(key + "-page", 1) > pages:
+            st.session_state[key + "-page"] = pages
+        page = st.number_input("Page (of {})".format(pages), 1, pages, 1, key=key + "-page")
+    start = (page - 1) * page_size
+    view = df.iloc[start:start + page_size][columns]  # slice first so only the page is copied
+    st.caption("Rows {} to {} of {}".format(min(start + 1, len(df)), start + len(view), len(df)))
+    st.dataframe(view)
+    return view
@@ -0,0 +1,382 @@
+"""The disease pages, drawn from their dataset specs.
+
+The LF and STH pages used to be two copies of one pipeline (load, cube,
+slice, map, charts, table), each with its own cached loaders and its own
+copy of every optimization. `app(name)` is that pipeline once, driven by
+specs/<name>.json (see datasets.py):
+
+- the snapshot, cube, map join and analytics are cached per dataset and
+  snapshot version (and metric group for the analytics),
+- the charts come from the spec's `charts`, one per country or summarised
+  for large selections (charts.py), and are kept in the figure cache,
+- the map is a choropleth or a bubble map, served from the map store
+  (maps.py) when it has been drawn before,
+- map, charts and table are built side by side (scheduler.py), the tables
+  are paged (dataview.py) and every stage is timed (perf.py).
+
+Register a page with `MultiApp.add_spec(name)`.
+"""
+import folium
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+import plotly.io as pio
+import streamlit as st
+import streamlit.components.v1 as components
+from branca.colormap import LinearColormap, linear
+
+import analytics
+import charts
+import datastore
+import dataview
+import figcache
+import geo
+import maps
+import perf
+import scheduler
+
+# what the map can be coloured by; "National coverage" is the coverage of the metric group
+MAP_METRICS = ["National coverage"] + list(analytics.METRICS)
+
+HIDE_MENU = """
+<style>
+#MainMenu{
+    visibility:hidden;
+}
+footer{visibility:hidden;
+}
+</style>
+"""
+
+
+@st.cache  # cache the functions for faster use
+def get_data(name, version):
+    return datastore.load(name)  # cleaned snapshot of the workbook, cached per version
+
+
+@st.cache(allow_output_mutation=True)
+def get_cube(name, version):  # country x year x metric aggregates of the snapshot, cached per version
+    return datastore.cube(name)
+
+
+@st.cache(allow_output_mutation=True)
+def get_join(name, version):  # map feature of every cube country, joined on the WHO country codes
+    return geo.Join(get_cube(name, version).countries, datastore.country_codes(name))
+
+
+@st.cache(allow_output_mutation=True)
+def get_analytics(name, version, group):  # yearly changes, ranks, streaks and gaps per country
+    return build_analytics(datastore.DATASETS[name], get_cube(name, version), group)
+
+
+def _span(year):
+    return {"first": year[0], "last": year[1]}
+
+
+def figures(spec, data, group, year):
+    """builds the spec's charts for the selected rows, one trace per country"""
+    columns = spec.metrics(group)
+    countries = data.index.unique()
+    figs = []
+    for chart in spec.charts:
+        column = columns[chart["metric"]]
+        options = dict(x="year", y=column, color=data.index, hover_name=data.index,
+                       log_x=chart.get("log_x", False), title=chart["title"].format(**_span(year)))
+        if chart["kind"] == "area":
+            fig = px.area(data, **options)
+        elif chart["kind"] == "scatter":  # sized by the value too
+            fig = px.scatter(data, size=column, render_mode=charts.render_mode(countries, "svg"), **options)
+        else:
+            # WebGL keeps the browser responsive once there are many country traces
+            fig = px.line(data, render_mode=charts.render_mode(countries), **options)
+        fig.update_layout(margin=charts.MARGIN)
+        figs.append(fig)
+    return figs
+
+
+def aggregate_figures(spec, bands, group, year):
+    """the same charts summarised over the selected countries: totals for counts, median/IQR bands for rates"""
+    columns = spec.metrics(group)
+    figs = []
+    for chart in spec.charts:
+        column = columns[chart["metric"]]
+        draw = charts.band if column in spec.rates else charts.total
+        figs.append(draw(bands, column, chart["aggregate_title"].format(**_span(year))))
+    return figs
+
+
+def _colour_column(spec, group, metric):
+    """the column the map is coloured by"""
+    return metric if metric in analytics.METRICS else spec.metrics(group)["coverage"]
+
+
+def choropleth(spec, averages, keys, group, metric, rec=perf.Recorder("engine", False)):
+    """the choropleth of `averages`; `keys` are the map features of its rows"""
+    column = _colour_column(spec, group, metric)
+    #per country averages rounded to 2 decimal places
+    groupby_country = averages.round(2)
+
+    #initialize the basemap
+    zoom = 2.7
+    m = folium.Map(location=[7.188,21.093],zoom_start=zoom, tiles="OpenStreetMap")
+    if groupby_country.empty:
+        return m
+
+    # simplified polygons of the selected countries, carrying the averages
+    with rec.stage("geometry") as stage:
+        merged_geo = geo.features(groupby_country, keys)
+        stage.measure(merged_geo)
+    if not merged_geo["features"]:  # none of the countries has an outline, see Join.missing
+        return m
+
+    # same six equal bins the folium Choropleth used to compute, green being good
+    values = groupby_country[column].dropna()
+    vmin, vmax = (values.min(), values.max()) if len(values) else (0, 1)
+    palette = linear.RdYlGn_06 if analytics.METRICS.get(metric, True) else LinearColormap(linear.RdYlGn_06.colors[::-1])
+    colormap = palette.scale(vmin, max(vmax, vmin + 1)).to_step(6)
+    extra = [metric] if metric in analytics.METRICS else []  # shown in the tooltip too
+    colormap.caption = metric if extra else spec.map.get("legend", column)
+    color = lambda value: colormap(value) if value == value else "#cccccc"  # grey when there's no value
+
+    # one layer does both the fill and the hover tooltip
+    style_function = lambda x: {'fillColor': color(x['properties'][column]),
+                                'color':'#000000',
+                                'fillOpacity':0.8,
+                                'weight':0.3}
+    highlight_function = lambda x:{'color':'#000000',
+                                   'fillOpacity':0.5,
+                                   'weight':1}
+
+    tooltip = spec.map.get("tooltip", {column: column})
+    high = folium.features.GeoJson(
+        data = merged_geo,
+        style_function = style_function,
+        smooth_factor=0,
+        control=False,
+        highlight_function=highlight_function,
+        tooltip = folium.features.GeoJsonTooltip(
+            fields=['country'] + list(tooltip) + extra,
+            aliases=['Country'] + list(tooltip.values()) + extra,
+            style= ("background-color:#00bfb3; color:#333333;font-family:arial;font-size: 12px; padding:10px;")
+        ))
+
+    m.add_child(high)
+    m.add_child(colormap)
+
+    return m
+
+
+def bubbles(spec, averages, group, metric, rec=perf.Recorder("engine", False)):
+    """bubble map of `averages`, sized by coverage and coloured by coverage or `metric`"""
+    groupby_country = averages
+    #look up the country coordinates in the offline centroid index
+    with rec.stage("geocode"):
+        locs = geo.centroids(groupby_country.index)
+    #let's create a new dataframe with the countries and their coordinates
+    country_loc = pd.DataFrame.from_dict(locs, orient='index', columns=['lat', 'lon'])
+    #let's merge the coordinates with the data
+    final_df= groupby_country.merge(country_loc,left_index=True,right_index=True)
+    #plotting the map, coloured by coverage or by one of the analytics metrics
+    coverage_column = spec.metrics(group)["coverage"]
+    coverage = final_df[coverage_column]
+    if metric in analytics.METRICS:
+        figu = px.scatter_mapbox(data_frame=final_df,lon = final_df['lon'].astype(float),lat=final_df['lat'].astype(float),
+        color=final_df[metric],size=coverage,hover_name=final_df.index,labels={'color': metric},
+        color_continuous_scale='RdYlGn' if analytics.METRICS[metric] else 'RdYlGn_r')
+    else:
+        # coverages given as fractions are coloured in %
+        percent = coverage if coverage_column in spec.percent else coverage*100
+        figu = px.scatter_mapbox(data_frame=final_df,lon = final_df['lon'].astype(float),lat=final_df['lat'].astype(float),
+        color=percent,size=coverage,
+        hover_name=final_df.index)
+    figu.update_layout(hovermode='closest',mapbox=dict(style='open-street-map',
+                                  center=go.layout.mapbox.Center(lat=7.18805555556, lon=21.0936111111), zoom=2), margin={'r': 0, 'l': 0, 'b': 0, 't': 0})
+    return figu
+
+
+def render_map(spec, averages, group, metric, keys=None, rec=perf.Recorder("engine", False)):
+    """The map as text, the way the map store keeps it.
+
+    A choropleth is a standalone HTML document and needs the map `keys` of the
+    rows of `averages`; a bubble map is Plotly figure JSON.
+    """
+    if spec.map["kind"] == "bubbles":
+        with rec.stage("map") as stage:
+            text = bubbles(spec, averages, group, metric, rec).to_json()
+            stage.measure(text)
+        return text
+    with rec.stage("map"):
+        m = choropleth(spec, averages, keys, group, metric, rec)
+    with rec.stage("map_html") as stage:
+        html = folium.Figure().add_child(m).render()
+        stage.measure(html)
+    return html
+
+
+def map_version(cube, nation, metric, join=None):
+    """the data a stored map depends on: the selected countries', or every country's for ranks,
+    and for a choropleth the map features they are drawn on"""
+    version = cube.version if metric == analytics.RANK else cube.version_of(nation)
+    if join is not None:
+        version = [version, sorted(str(k) for k in join.keys[cube.codes(nation)])]
+    return version
+
+
+def map_options(spec, group, metric):
+    """what else than the selection a stored map depends on, see maps.artifact"""
+    options = {"metric": metric}
+    if len(spec.groups) > 1:
+        options["group"] = group
+    return options
+
+
+def build_analytics(spec, cube, group):
+    """yearly changes, ranks, streaks and gaps for a metric group, against the spec's WHO target"""
+    columns = spec.metrics(group)
+    return analytics.Analytics(cube, columns["coverage"], columns["required"], columns["treated"],
+                               target=spec.target)
+
+
+def summary(cube, stats, nation, year):
+    """per country averages over the selection, with the comparisons from `build_analytics`"""
+    means = cube.means(nation, year[0], year[-1])
+    return means.join(stats.table(nation, year[0], year[-1]))
+
+
+def table_columns(spec, averages, group):
+    """the columns of the averages table: all of them, or those of the selected group"""
+    if len(spec.groups) == 1:
+        return list(averages.columns)
+    return spec.columns(group) + list(analytics.METRICS)
+
+
+def _pairs(figs):
+    """shows figures two by two, side by side for comparison"""
+    for i in range(0, len(figs), 2):
+        for col, fig in zip(st.columns(2), figs[i:i + 2]):
+            col.plotly_chart(fig, use_container_width=True)
+
+
+def app(name):
+    """the page of dataset `name`"""
+    spec = datastore.DATASETS[name]
+    st.markdown(HIDE_MENU, unsafe_allow_html=True)
+
+    # set page title
+    col1, col2 = st.columns(2)
+    col2.title(spec.title)
+    st.markdown('----')
+
+    def graphs(data):
+        # big selections are summarised unless asked otherwise
+        aggregate = charts.aggregated(mode, nation)
+        build = lambda: (aggregate_figures(spec, cube.bands(nation, year[0], year[-1]), group, year) if aggregate
+                         else figures(spec, data, group, year))
+        # reuse the figures if this selection has been drawn before
+        key = figcache.selection_key(name, cube.version_of(nation), nation, year, group, aggregate)
+        with rec.stage("graphs") as stage:
+            figs = figcache.cache.figures(key, build)
+            stage.measure(figs)
+        return figs
+
+    def show_graphs(figs):
+        if spec.raw_data:
+            # table to display raw data, only sent once asked for
+            dataview.show(data, key=name + "-raw", label=spec.raw_data, lazy=True,
+                          columns=["year"] + spec.columns(group))
+        pending = []
+        for chart, fig in zip(spec.charts, figs):
+            if "expander" in chart:
+                with st.expander(chart["expander"]):
+                    st.plotly_chart(fig, use_container_width=True)
+            else:
+                pending.append(fig)
+        _pairs(pending)
+
+    def map_text(averages):
+        # prerendered by maps.py for common selections, otherwise rendered here and stored for next time
+        def render():
+            keys = join.keys[cube.codes(averages.index)] if join else None  # averages come in cube order
+            return render_map(spec, averages, group, metric, keys, rec)
+        # only the run of the Fetch button counts as a request, not reruns from the other widgets
+        text = maps.artifact(name, map_version(cube, nation, metric, join), nation, year, map_options(spec, group, metric),
+                             render, requested=fetch)
+        return text if join else pio.from_json(text)
+
+    def show_map(m):
+        st.markdown(spec.map["caption"].format(**_span(year)))
+        if not join:
+            st.plotly_chart(m, use_container_width=True)
+            return
+        components.html(m, width=940, height=510)
+        # say which countries are missing rather than leaving them out silently
+        missing = join.missing(nation)
+        if missing:
+            st.caption("Not on the map: " + "; ".join("{} ({})".format(country, why) for country, why in missing.items()))
+
+    def table(averages):
+        """this function is for creating a table containing all the average values"""
+        with rec.stage("table") as stage:
+            table_df = averages.round(2)  # round off the decimals to two places
+            table_df = table_df[table_columns(spec, table_df, group)]
+            stage.measure(table_df)
+        return table_df
+
+    def show_table(table_df):
+        st.markdown("*Average* values by country from {} to {}".format(year[0], year[1]))
+        dataview.show(table_df, key=name + "-table")
+
+    # time the stages below when NTD_PERF=1 or ?debug=1
+    rec = perf.recorder(name)
+
+    # let's get the data
+    # ingested rows change the version, so they show up without a restart
+    with rec.stage("get_data") as stage:
+        version = datastore.version(name)
+        df = get_data(name, version)
+        stage.measure(df)
+    with rec.stage("cube"):
+        cube = get_cube(name, version)
+        join = get_join(name, version) if spec.map["kind"] == "choropleth" else None
+
+    # sidebar options
+    with st.sidebar.form(key="fetch"):
+        nation = st.multiselect("Select countries", df.index.unique().tolist(), spec.countries)
+        year = st.select_slider("Select year", options=np.sort(df.year.unique()), value=spec.years)
+        group = st.selectbox("Population type", list(spec.groups)) if len(spec.groups) > 1 else next(iter(spec.groups))
+        metric = st.selectbox("Colour the map by", MAP_METRICS,
+                              help="WHO target: {:g}% national coverage".format(spec.target_percent(group)))
+        mode = st.selectbox("Charts", charts.MODES,
+                            help="Aggregate shows totals and median/IQR bands instead of one line per country; "
+                                 "Auto does so above {} countries".format(charts.THRESHOLD))
+        fetch = st.form_submit_button(label="Fetch")
+
+    # sidebar info
+    with st.sidebar.expander("Click to view Glossary"):
+        st.markdown("\n".join("- " + entry for entry in spec.glossary))
+
+    # remember the Fetch, so paging through the tables doesn't clear the page
+    if fetch:
+        st.session_state[name + "_fetched"] = True
+    if st.session_state.get(name + "_fetched"):
+        # prepare the data for graphing and the per country averages
+        with rec.stage("slice") as stage:
+            data = cube.rows(nation, year[0], year[-1])
+            # per country averages and comparisons, for the map and the table
+            averages = summary(cube, get_analytics(name, version, group), nation, year)
+            stage.measure(data)
+        if len(spec.groups) > 1:
+            st.info(spec.group_heading.format(group))
+
+        # the map, the graphs and the table are built side by side and each
+        # one is shown in its place as soon as it's ready
+        parts = scheduler.Scheduler()
+        parts.add("map", lambda: map_text(averages), show_map)
+        parts.add("graphs", lambda: graphs(data), show_graphs)
+        parts.add("table", lambda: table(averages), show_table)
+        parts.run()
+        rec.finish(figure_cache=figcache.cache.stats())
+    else:
+        st.warning('Please select from the parameters on the left 👈🏾  and press "Fetch"')
+        st.info("If you don't select a country, you'll get blank graphs 🤪")
@@ -0,0 +1,103 @@
+"""Process-wide LRU cache of serialized Plotly figures.
+
+Building the charts with plotly express is the slowest part of a Fetch, and
+most users keep asking for the same few country combinations. The figures of a
+selection are stored as JSON, keyed on the normalized selection, and evicted
+least-recently-used first once the cache grows past its byte budget. Set
+NTD_FIGURE_CACHE_MB to change the budget (default 64). Misses are looked up in
+the cross-process sharedcache before anything is built.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+import plotly.io as pio
+
+import sharedcache
+
+# bump when the charts are drawn differently, so figures stored by older code
+# (the sharedcache outlives restarts) are built again
+FIGURE_VERSION = 2
+
+
+def selection_key(dataset, version, countries, years, *extra):
+    """Normalizes a selection into a hashable key.
+
+    The countries are sorted so the same countries picked in a different order
+    share an entry, and numpy years become plain ints.
+    """
+    countries = tuple(sorted(set(str(c) for c in countries)))
+    years = tuple(int(y) for y in years)
+    return (FIGURE_VERSION, dataset, version, countries, years) + tuple(extra)
+
+
+class FigureCache:
+    """Bounded mapping of selection key -> list of figure JSON strings.
+
+    Parameters
+    ----------
+    max_bytes:
+        total size of the stored JSON after which old entries are dropped.
+    """
+    def __init__(self, max_bytes=64 << 20):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        size = sum(len(s) for s in value)
+        if size > self.max_bytes:
+            return  # would evict everything else
+        with self._lock:
+            if key in self._entries:
+                self.size -= sum(len(s) for s in self._entries.pop(key))
+            self._entries[key] = value
+            self.size += size
+            while self.size > self.max_bytes:
+                _, old = self._entries.popitem(last=False)
+                self.size -= sum(len(s) for s in old)
+
+    def figures(self, key, build):
+        """Returns the figures for `key`, calling `build()` and storing its result on a miss.
+
+        Misses fall back to the shared cache, so figures built by another
+        process are reused too.
+        """
+        cached = self.get(key)
+        if cached is None:
+            shared_key = sharedcache.key("figures", *key)
+            cached = sharedcache.get_json(shared_key)
+            if cached is None:
+                figs = build()
+                cached = [fig.to_json() for fig in figs]
+                sharedcache.set_json(shared_key, cached)
+                self.put(key, cached)
+                return figs
+            self.put(key, cached)
+        return [pio.from_json(s) for s in cached]
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses,
+                    "entries": len(self._entries), "bytes": self.size}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+
+cache = FigureCache(int(float(os.environ.get("NTD_FIGURE_CACHE_MB", 64)) * (1 << 20)))
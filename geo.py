@@ -0,0 +1,249 @@
+"""Offline country lookups and map geometry built from custom.geo.json.
+
+The centroid index and the join index are prebuilt and checked in next to the
+GeoJSON. Rebuild them whenever custom.geo.json changes:
+
+    python geo.py
+
+The join index maps ISO 3166 alpha-3 codes, which is what the WHO
+`country_code` column holds, to the `adm0_a3` code of each feature, so maps
+join on codes rather than on country names that are spelled differently
+("Côte d'Ivoire" vs "Ivory Coast"). A `Join` lines the features up with the
+countries of a cube once per snapshot and records every country that can't
+be drawn, and why.
+
+The polygons themselves are read once per process and pre-simplified once,
+so a map render only has to attach the values for the selected countries.
+"""
+import copy
+import json
+import os
+from functools import lru_cache
+
+import numpy as np
+
+import sharedcache
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+GEOJSON = os.path.join(HERE, "custom.geo.json")
+INDEX = os.path.join(HERE, "country_index.json")
+JOIN_INDEX = os.path.join(HERE, "join_index.json")
+
+# WHO country names that don't match the Natural Earth `admin` names
+ALIASES = {
+    "Côte d'Ivoire": "Ivory Coast",
+    "Congo": "Republic of Congo",
+    "Cabo Verde": "Cape Verde",
+    "Guinea-Bissau": "Guinea Bissau",
+    "Eswatini": "Swaziland",
+}
+
+# simplification tolerance in degrees, fine for the continent-wide zoom the
+# page opens at; the map is a single HTML document, so there's no way to
+# send more detail once the user zooms in
+TOLERANCE = 0.05
+
+# properties kept on the map features, everything else is dropped
+PROPERTIES = ["admin", "adm0_a3"]
+
+# places reported by WHO that have no polygon in custom.geo.json
+POINTS = {
+    "Mauritius": (-20.276, 57.570),
+    "Seychelles": (-4.657, 55.454),
+    "United Republic of Tanzania (Zanzibar)": (-6.166, 39.203),
+}
+
+
+def _ring_centroid(ring):
+    """area and centroid of a closed [lon, lat] ring (shoelace formula)"""
+    area = cx = cy = 0.0
+    for (x0, y0), (x1, y1) in zip(ring, ring[1:]):
+        cross = x0 * y1 - x1 * y0
+        area += cross
+        cx += (x0 + x1) * cross
+        cy += (y0 + y1) * cross
+    area /= 2
+    if area == 0:
+        return 0.0, ring[0][0], ring[0][1]
+    return abs(area), cx / (6 * area), cy / (6 * area)
+
+
+def _centroid(geometry):
+    """area weighted centroid of a Polygon/MultiPolygon as (lat, lon)"""
+    polygons = geometry["coordinates"]
+    if geometry["type"] == "Polygon":
+        polygons = [polygons]
+    total = lon = lat = 0.0
+    for polygon in polygons:
+        area, x, y = _ring_centroid(polygon[0])  # outer ring only
+        total += area
+        lon += x * area
+        lat += y * area
+    return round(lat / total, 4), round(lon / total, 4)
+
+
+def build_index(geojson=GEOJSON, path=INDEX):
+    """Computes the country -> (lat, lon) index and writes it to disk."""
+    with open(geojson, encoding="utf-8") as f:
+        features = json.load(f)["features"]
+    index = {f["properties"]["admin"]: _centroid(f["geometry"]) for f in features}
+    index.update(POINTS)
+    lines = ["  {}: {}".format(json.dumps(name, ensure_ascii=False), json.dumps(index[name]))
+             for name in sorted(index)]
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("{\n" + ",\n".join(lines) + "\n}\n")
+    return index
+
+
+def build_join_index(geojson=GEOJSON, path=JOIN_INDEX):
+    """Computes the ISO alpha-3 -> adm0_a3 index and writes it to disk.
+
+    The two only differ for a few features (South Sudan is SSD vs SDS) and
+    features without an ISO code, like Somaliland, can't be joined at all.
+    """
+    with open(geojson, encoding="utf-8") as f:
+        features = json.load(f)["features"]
+    index = {f["properties"]["iso_a3"]: f["properties"]["adm0_a3"]
+             for f in features if f["properties"]["iso_a3"] != "-99"}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(index, f, indent=1, sort_keys=True)
+        f.write("\n")
+    return index
+
+
+@lru_cache(maxsize=None)
+def load_index(path=INDEX):
+    with open(path, encoding="utf-8") as f:
+        return {name: tuple(loc) for name, loc in json.load(f).items()}
+
+
+@lru_cache(maxsize=None)
+def load_join_index(path=JOIN_INDEX):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+class Join:
+    """The map feature of each country of a cube, in cube order.
+
+    Parameters
+    ----------
+    countries:
+        the WHO country names, e.g. `Cube.countries`.
+    codes:
+        {country: WHO country code}, see `datastore.country_codes`.
+
+    `keys[i]` is the adm0_a3 code of the feature for `countries[i]`, or None
+    when it has none; `gaps` says why for each of those.
+    """
+    def __init__(self, countries, codes):
+        index = load_join_index()
+        self.keys = np.full(len(countries), None, dtype=object)
+        self.gaps = {}
+        taken = {}
+        for i, name in enumerate(countries):
+            code = codes.get(name)
+            if name in POINTS:
+                self.gaps[name] = "no outline of its own in the map"
+            elif not code:
+                self.gaps[name] = "no country code in the WHO data"
+            elif code not in index:
+                self.gaps[name] = "no outline for {} in the map".format(code)
+            elif index[code] in taken:
+                self.gaps[name] = "same code ({}) as {}".format(code, taken[index[code]])
+            else:
+                self.keys[i] = taken[index[code]] = index[code]
+
+    def missing(self, countries):
+        """{country: reason} for the given countries that won't show on the map"""
+        return {name: self.gaps[name] for name in countries if name in self.gaps}
+
+
+@lru_cache(maxsize=None)
+def shapes():
+    """custom.geo.json as a GeoDataFrame, read once per process"""
+    import geopandas as gpd
+    return gpd.read_file(GEOJSON)[PROPERTIES + ["geometry"]]
+
+
+def _round(coords, ndigits):
+    if isinstance(coords[0], (int, float)):
+        return [round(c, ndigits) for c in coords]
+    return [_round(c, ndigits) for c in coords]
+
+
+@lru_cache(maxsize=None)
+def _features():
+    gdf = shapes()
+    geometry = gdf.geometry.simplify(TOLERANCE, preserve_topology=True)
+    features = {}
+    for props, geom in zip(gdf[PROPERTIES].to_dict("records"), geometry):
+        geom = geom.__geo_interface__
+        features[props["adm0_a3"]] = {
+            "type": "Feature",
+            "properties": props,
+            "geometry": {"type": geom["type"], "coordinates": _round(geom["coordinates"], 3)},
+        }
+    return features
+
+
+def features(values, keys):
+    """Builds a FeatureCollection for the countries in `values`.
+
+    Parameters
+    ----------
+    values:
+        a frame with one row per country; its columns are copied into the
+        feature properties, along with `country`, the index.
+    keys:
+        the adm0_a3 code for each row of `values`, e.g. gathered from
+        `Join.keys` with the cube codes. Rows whose key is None are left out.
+    """
+    simplified = _features()
+    collection = []
+    for country, key, row in zip(values.index, keys, values.to_dict("records")):
+        if key is None:
+            continue
+        feature = copy.copy(simplified[key])
+        feature["properties"] = dict(feature["properties"], country=country, **row)
+        collection.append(feature)
+    return {"type": "FeatureCollection", "features": collection}
+
+
+@lru_cache(maxsize=None)
+def _geolocator():
+    from geopy.geocoders import Nominatim  # only needed for unknown names
+    return Nominatim(user_agent="lf")
+
+
+@lru_cache(maxsize=256)
+def geocode(name):
+    """Nominatim fallback for names missing from the index, shared between processes"""
+    key = sharedcache.key("geocode", name)
+    cached = sharedcache.get_json(key)
+    if cached is not None:
+        return tuple(cached) or None  # [] marks a name Nominatim doesn't know
+    location = _geolocator().geocode(name)
+    loc = () if location is None else (float(location.raw["lat"]), float(location.raw["lon"]))
+    sharedcache.set_json(key, loc)
+    return loc or None
+
+
+def locate(name):
+    """Returns (lat, lon) for a WHO country name, or None if it can't be found."""
+    index = load_index()
+    loc = index.get(ALIASES.get(name, name))
+    return loc if loc is not None else geocode(name)
+
+
+def centroids(names):
+    """Returns a {name: (lat, lon)} dict for the given names, skipping unknowns."""
+    locs = {name: locate(name) for name in names}
+    return {name: loc for name, loc in locs.items() if loc is not None}
+
+
+if __name__ == "__main__":
+    index = build_index()
+    print("wrote {} countries to {}".format(len(index), INDEX))
+    index = build_join_index()
+    print("wrote {} codes to {}".format(len(index), JOIN_INDEX))
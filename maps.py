@@ -0,0 +1,252 @@
+"""Prerendered maps for the disease pages.
+
+Rendering a map is the slowest part of a Fetch, yet most Fetches ask for the
+same few selections: the page defaults, every country, and whatever the
+users of a deployment keep coming back to. Maps are stored as files (a
+choropleth as an HTML document, a bubble map as Plotly JSON) under
+.maps/v<MAP_VERSION>/<disease>/, keyed like the caches on the selected
+countries' data version, the countries, the years and the map options.
+Pages call `artifact`, which serves a stored map or renders, stores and
+returns a new one, and logs the request.
+
+The precompute job renders ahead of time the maps for the page defaults and
+for every country over every year, in each map metric (and metric group), plus
+the most requested selections from the log:
+
+    python maps.py                  # once, e.g. after datastore.py --ingest
+    python maps.py --every 3600     # keep running, once an hour
+
+NTD_MAP_STORE moves the store, "none" turns it off. Unlike the sharedcache,
+the store isn't size bounded: the job removes the
+artifacts of older MAP_VERSIONs, and the ones nobody has asked for in
+NTD_MAP_MAX_AGE days (default 30) that aren't among the precomputed ones.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+from collections import Counter
+
+import datasets
+import sharedcache
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+STORE = os.environ.get("NTD_MAP_STORE", os.path.join(HERE, ".maps"))
+MAX_AGE = float(os.environ.get("NTD_MAP_MAX_AGE", 30)) * 86400
+
+# bump when the way maps are drawn changes so every map is rendered again
+MAP_VERSION = 1
+
+# file extension of each kind of map, see datasets.MAP_KINDS
+EXT = {"choropleth": ".html", "bubbles": ".json"}
+LOG = "requests.log"
+COUNTS = "counts.json"
+
+
+def key(disease, version, countries, years, options):
+    return sharedcache.key(disease, version, sorted(set(str(c) for c in countries)),
+                           [int(y) for y in years], options)
+
+
+def _root():
+    return os.path.join(STORE, "v{}".format(MAP_VERSION))
+
+
+def _path(disease, key):
+    return os.path.join(_root(), disease, key + EXT[datasets.load(disease).map["kind"]])
+
+
+def get(disease, key):
+    if STORE == "none":
+        return None
+    path = _path(disease, key)
+    try:
+        with open(path, encoding="utf-8") as f:
+            text = f.read()
+        os.utime(path)  # mtime marks recent use, see prune
+    except OSError:
+        return None
+    return text
+
+
+def put(disease, key, text):
+    if STORE == "none":
+        return
+    path = _path(disease, key)
+    tmp = "{}.{}.{}.tmp".format(path, os.getpid(), threading.get_ident())  # sessions are threads
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp, path)
+    except OSError as e:  # a read-only or full disk only costs the next render
+        sharedcache.log.warning("couldn't store map %s: %s", path, e)
+
+
+def record(disease, countries, years, options):
+    """appends the selection to the request log the precompute job reads"""
+    if STORE == "none":
+        return
+    line = json.dumps([disease, sorted(set(str(c) for c in countries)), [int(y) for y in years], options])
+    try:
+        os.makedirs(STORE, exist_ok=True)
+        with open(os.path.join(STORE, LOG), "a", encoding="utf-8") as f:
+            f.write(line + "\n")  # one short write, so lines from several processes don't interleave
+    except OSError:
+        pass
+
+
+def artifact(disease, version, countries, years, options, render, requested=True):
+    """Returns the stored map for a selection, calling `render()` and storing the result on a miss.
+
+    Parameters
+    ----------
+    version:
+        the data version of the selected countries, see `Cube.version_of`.
+    options:
+        dict of anything else the map depends on, e.g. {"metric": ...}.
+    render:
+        builds the map text (HTML or figure JSON) for this selection.
+    requested:
+        whether to count the selection for the precompute job; False on
+        page reruns that only redraw a selection already counted.
+    """
+    if requested:
+        record(disease, countries, years, options)
+    k = key(disease, version, countries, years, options)
+    text = get(disease, k)
+    if text is None:
+        text = render()
+        put(disease, k, text)
+    return text
+
+
+# precompute job ----------------------------------------------------------------
+
+def _counts():
+    """folds the request log into the running counts and returns them"""
+    path, counts_path = os.path.join(STORE, LOG), os.path.join(STORE, COUNTS)
+    try:
+        with open(counts_path, encoding="utf-8") as f:
+            counts = Counter(json.load(f))
+    except (OSError, ValueError):
+        counts = Counter()
+    taken = "{}.{}".format(path, os.getpid())
+    try:
+        os.replace(path, taken)  # new requests go to a fresh log meanwhile
+    except OSError:
+        return counts
+    with open(taken, encoding="utf-8") as f:
+        counts.update(line.strip() for line in f if line.strip())
+    os.remove(taken)
+    tmp = counts_path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(counts, f)
+    os.replace(tmp, counts_path)
+    return counts
+
+
+class _Context:
+    """the cube and friends of one disease, as the page builds them"""
+    def __init__(self, disease):
+        import datastore
+        import engine
+        self.engine = engine
+        self.spec = datasets.load(disease)
+        self.cube = datastore.cube(disease)
+        self.join = None
+        if self.spec.map["kind"] == "choropleth":
+            import geo
+            self.join = geo.Join(self.cube.countries, datastore.country_codes(disease))
+        self.stats = {}
+
+    def analytics(self, group):
+        if group not in self.stats:
+            self.stats[group] = self.engine.build_analytics(self.spec, self.cube, group)
+        return self.stats[group]
+
+    def render(self, countries, years, options):
+        group = options.get("group", next(iter(self.spec.groups)))
+        averages = self.engine.summary(self.cube, self.analytics(group), countries, years)
+        keys = self.join.keys[self.cube.codes(averages.index)] if self.join else None
+        return self.engine.render_map(self.spec, averages, group, options["metric"], keys)
+
+
+def _common(ctx):
+    """(countries, years, options) for the defaults and for everything, in every option"""
+    spec, cube = ctx.spec, ctx.cube
+    everything = (cube.countries.tolist(), (int(cube.years[0]), int(cube.years[-1])))
+    defaults = (spec.countries, spec.years)
+    options = [ctx.engine.map_options(spec, group, m) for group in spec.groups for m in ctx.engine.MAP_METRICS]
+    return [(countries, years, o) for countries, years in (defaults, everything) for o in options]
+
+
+def precompute(diseases, top=20):
+    """Renders the common and the `top` most requested maps that aren't stored yet.
+
+    Returns (rendered, already stored) counts.
+    """
+    counts = _counts()
+    rendered = stored = 0
+    wanted = set()
+    for disease in diseases:
+        ctx = _Context(disease)
+        jobs = _common(ctx)
+        popular = [json.loads(k) for k, _ in counts.most_common() if json.loads(k)[0] == disease][:top]
+        known = set(ctx.cube.countries)
+        jobs += [(countries, years, options) for _, countries, years, options in popular
+                 if set(countries) <= known]  # skip countries that are gone from the data
+        for countries, years, options in jobs:
+            version = ctx.engine.map_version(ctx.cube, countries, options["metric"], ctx.join)
+            k = key(disease, version, countries, years, options)
+            wanted.add(_path(disease, k))
+            if get(disease, k) is not None:
+                stored += 1
+                continue
+            put(disease, k, ctx.render(countries, years, options))
+            rendered += 1
+    prune(wanted)
+    return rendered, stored
+
+
+def prune(keep=()):
+    """drops older MAP_VERSIONs and maps unused for MAX_AGE, except those in `keep`"""
+    if not os.path.isdir(STORE):
+        return
+    for name in os.listdir(STORE):
+        if name.startswith("v") and name != os.path.basename(_root()):
+            shutil.rmtree(os.path.join(STORE, name), ignore_errors=True)
+    now = time.time()
+    for disease in datasets.names():
+        folder = os.path.join(_root(), disease)
+        for name in os.listdir(folder) if os.path.isdir(folder) else []:
+            path = os.path.join(folder, name)
+            try:
+                if path not in keep and now - os.path.getmtime(path) > MAX_AGE:
+                    os.remove(path)
+            except OSError:
+                pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prerender the common maps of every dataset.")
+    parser.add_argument("-d", "--disease", action="append", choices=datasets.names())
+    parser.add_argument("--top", type=int, default=20, help="most requested selections to render, per disease")
+    parser.add_argument("--every", type=float, metavar="SECONDS", help="keep running, once every SECONDS")
+    args = parser.parse_args(argv)
+    sys.path.insert(0, HERE)
+    while True:
+        start = time.time()
+        rendered, stored = precompute(args.disease or datasets.names(), args.top)
+        print("{} maps rendered, {} already stored ({:.1f} s)".format(rendered, stored, time.time() - start),
+              flush=True)
+        if not args.every:
+            return 0
+        time.sleep(max(0, args.every - (time.time() - start)))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,26 @@
 """Frameworks for running multiple Streamlit applications as a single app.
+
+Page modules can be registered by import path so that they're only imported
+the first time somebody opens them, and disease pages by the name of their
+dataset spec (see datasets.py and engine.py). To see what each page costs to
+import in a fresh interpreter run:
+
+    python multiapp.py about engine
 """
+import importlib
+import logging
+import os
+import subprocess
+import sys
+import time
+
 import streamlit as st
 
+log = logging.getLogger(__name__)
+
+# seconds spent importing each lazily loaded page module in this process
+IMPORT_TIMES = {}
+
 class MultiApp:
     """Framework for combining multiple streamlit applications.
     Usage:
@@ -20,6 +39,16 @@ class MultiApp:
         app.add_app("Foo", foo.app)
         app.add_app("Bar", bar.app)
         app.run()
+    Or pass the module path instead, so the file is only imported once its
+    app is selected ("foo" means "foo:app").
+        app = MultiApp()
+        app.add_app("Foo", "foo")
+        app.add_app("Bar", "bar:main")
+        app.run()
+    A disease page only needs its spec, specs/<name>.json.
+        app = MultiApp()
+        app.add_spec("lf")
+        app.run()
     """
     def __init__(self):
         self.apps = []
@@ -29,7 +58,8 @@ class MultiApp:
         Parameters
         ----------
         func:
-            the python function to render this app.
+            the python function to render this app, or a "module" /
+            "module:function" path imported when the app is first selected.
         title:
             title of the app. Appears in the dropdown in the sidebar.
         """
@@ -38,6 +68,17 @@ class MultiApp:
             "function": func
         })
 
+    def add_spec(self, name):
+        """Adds the page of a dataset spec, titled after the spec.
+        Parameters
+        ----------
+        name:
+            the dataset name, e.g. "lf" for specs/lf.json. The page engine
+            is imported when a spec page is first selected.
+        """
+        import datasets
+        self.add_app(datasets.load(name).title, lambda: load("engine:app")(name))
+
     def run(self):
         # app = st.sidebar.radio(
         app = st.sidebar.selectbox(
@@ -46,4 +87,48 @@ class MultiApp:
             format_func=lambda app: app['title'])
         st.sidebar.markdown(
             "⭕ Check me out on [Github](https://github.com/akele-guzay/LF)")
-        app['function']()
+        load(app['function'])()
+
+
+def load(func):
+    """Resolves a "module:function" path, timing the first import of the module."""
+    if callable(func):
+        return func
+    name, _, attr = func.partition(":")
+    if name not in sys.modules:
+        start = time.perf_counter()
+        importlib.import_module(name)
+        IMPORT_TIMES[name] = time.perf_counter() - start
+        log.info("imported page %s in %.3fs", name, IMPORT_TIMES[name])
+    return getattr(sys.modules[name], attr or "app")
+
+
+# run in a fresh interpreter per page so pages don't share import costs
+_PROBE = """
+import resource, sys, time
+sys.path.insert(0, {cwd!r})
+import streamlit
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+start = time.perf_counter()
+import {module}
+print(time.perf_counter() - start, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss)
+"""
+
+
+def startup_report(modules):
+    """Import cost of each page module on top of a bare streamlit import.
+
+    Returns a list of (module, seconds, extra peak RSS in KiB) tuples.
+    """
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    report = []
+    for module in modules:
+        out = subprocess.run([sys.executable, "-c", _PROBE.format(cwd=cwd, module=module)],
+                             check=True, capture_output=True, text=True).stdout.split()
+        report.append((module, float(out[-2]), int(out[-1])))
+    return report
+
+
+if __name__ == "__main__":
+    for module, seconds, rss in startup_report(sys.argv[1:] or ["about", "engine"]):
+        print("{:<10} {:>7.3f}s {:>8.1f} MiB".format(module, seconds, rss / 1024))
@@ -0,0 +1,132 @@
+"""Per-stage timing of the Fetch pipeline.
+
+Timing is off by default and then costs one no-op context manager per stage.
+Turn it on for the whole process with NTD_PERF=1, or for one browser tab by
+opening the app with ?debug=1. While on, every stage records its wall time and
+payload size, the numbers for the current Fetch are shown in a sidebar panel
+and each stage is logged as one JSON line on the "ntd.perf" logger, to stderr.
+Set NTD_PERF_LOG to a path to append those lines to a file instead, for
+aggregation.
+"""
+import json
+import logging
+import os
+import time
+import uuid
+
+import streamlit as st
+
+ENABLED = os.environ.get("NTD_PERF", "") not in ("", "0")
+
+log = logging.getLogger("ntd.perf")
+log.setLevel(logging.INFO)  # only stages of timed runs are logged, see `recorder`
+# without a handler of its own, logging would drop the INFO lines
+_handler = logging.FileHandler(os.environ["NTD_PERF_LOG"]) if os.environ.get("NTD_PERF_LOG") else logging.StreamHandler()
+_handler.setFormatter(logging.Formatter("%(message)s"))
+log.addHandler(_handler)
+
+
+def size_of(obj):
+    """Rough payload size in bytes of what a stage produced."""
+    if obj is None:
+        return 0
+    if isinstance(obj, (str, bytes)):
+        return len(obj)
+    if isinstance(obj, (list, tuple)):
+        return sum(size_of(o) for o in obj)
+    if isinstance(obj, dict):  # GeoJSON and the like
+        return len(json.dumps(obj))
+    if hasattr(obj, "memory_usage"):  # pandas
+        usage = obj.memory_usage(deep=True)
+        return int(usage.sum() if hasattr(usage, "sum") else usage)
+    if hasattr(obj, "get_root"):  # folium maps
+        return len(obj.get_root().render())
+    if hasattr(obj, "to_json"):  # plotly figures
+        return len(obj.to_json())
+    return 0
+
+
+class _NoStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def measure(self, obj):
+        pass
+
+
+_NO_STAGE = _NoStage()
+
+
+class _Stage:
+    def __init__(self, recorder, name):
+        self.recorder = recorder
+        self.name = name
+        self.payload = []
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self.start
+        # sizes are computed after the clock stops so they don't count as stage time
+        self.recorder.add(self.name, seconds, size_of(self.payload))
+        return False
+
+    def measure(self, obj):
+        """records `obj` as (part of) the payload this stage produced"""
+        self.payload.append(obj)
+
+
+class Recorder:
+    """Collects the stage timings of one run of a page.
+
+    Usage:
+        rec = perf.recorder("lf")
+        with rec.stage("map") as stage:
+            m = map(averages)
+            stage.measure(m)
+        rec.finish()
+    """
+    def __init__(self, page, enabled):
+        self.page = page
+        self.enabled = enabled
+        self.stages = []
+        if enabled:
+            self.session = st.session_state.setdefault("perf_session", uuid.uuid4().hex[:12])
+
+    def stage(self, name):
+        return _Stage(self, name) if self.enabled else _NO_STAGE
+
+    def add(self, name, seconds, nbytes):
+        self.stages.append({"stage": name, "ms": round(seconds * 1000, 2), "bytes": nbytes})
+
+    def finish(self, **counters):
+        """logs the stages and shows them in the sidebar, along with any counters"""
+        if not self.enabled or not self.stages:
+            return
+        ts = time.time()
+        for stage in self.stages:
+            log.info(json.dumps(dict(stage, ts=ts, page=self.page, session=self.session)))
+        if counters:
+            log.info(json.dumps(dict(counters, ts=ts, page=self.page, session=self.session)))
+        with st.sidebar.expander("⏱ Stage timings", expanded=True):
+            st.table(self.stages)
+            st.caption("total {:.0f} ms".format(sum(s["ms"] for s in self.stages)))
+            for name, value in counters.items():
+                st.caption("{}: {}".format(name, value))
+
+
+def _debug_param():
+    try:
+        return st.experimental_get_query_params().get("debug", ["0"])[0] not in ("", "0")
+    except Exception:  # not running under streamlit
+        return False
+
+
+def recorder(page):
+    """Returns a Recorder for one run of `page`, a no-op one unless timing is on."""
+    return Recorder(page, ENABLED or _debug_param())
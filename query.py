@@ -0,0 +1,296 @@
+"""Query the cleaned LF/STH data without the Streamlit app.
+
+The same snapshots and cube the pages use, served as a small local HTTP
+service or read from the command line. A query picks a disease, countries,
+an inclusive year range, a metric group (e.g. an STH age group) and metrics, and either the raw
+rows or the per-country averages. Results come back as Arrow IPC streams,
+Parquet files or CSV, and are kept in the sharedcache keyed on the selected
+countries' data, so repeated queries are served without touching pandas.
+
+    python query.py lf -c Mali -c Kenya --years 2010 2019 -f csv
+    python query.py sth --group sac --averages -f parquet -o sac.parquet
+    python query.py --batch queries.json -f arrow -o all.arrow
+    python query.py --serve --port 8502
+
+Over HTTP, GET /lf or /sth takes the same options as query parameters
+(?country=Mali&country=Kenya&years=2010,2019&format=arrow) and POST /batch a
+JSON list of queries; /datasets lists the countries, years, metrics and
+groups. The groups are the `key`s of the metric groups of each dataset spec
+(see datasets.py); `age` is accepted in place of `group`.
+Batch results are one table with a `query` column holding the position of
+the query that produced each row.
+"""
+import argparse
+import io
+import json
+import sys
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pandas as pd
+
+import datastore
+import sharedcache
+
+FORMATS = {"arrow": "application/vnd.apache.arrow.stream", "parquet": "application/vnd.apache.parquet",
+           "csv": "text/csv; charset=utf-8"}
+
+# rows per CSV chunk when streaming over HTTP
+CHUNK_ROWS = 1000
+
+
+class QueryError(ValueError):
+    """a query that can't be answered, reported back as a 400"""
+
+
+@lru_cache(maxsize=4)
+def _cube(disease, version):  # one per snapshot, the version is only the cache key
+    return datastore.cube(disease)
+
+
+def _strings(value, field):
+    """a list of strings from a query field, None when it's missing"""
+    if value is None:
+        return None
+    if not isinstance(value, list) or not all(isinstance(v, str) for v in value):
+        raise QueryError("{} should be a list of strings, got {!r}".format(field, value))
+    return value
+
+
+def cube(disease):
+    """the cube for the current snapshot of a dataset"""
+    if not isinstance(disease, str) or disease not in datastore.DATASETS:
+        raise QueryError("unknown disease {!r}, expected one of {}".format(disease, sorted(datastore.DATASETS)))
+    return _cube(disease, datastore.version(disease))
+
+
+def normalize(query):
+    """Checks a query and fills in the defaults.
+
+    Parameters
+    ----------
+    query:
+        dict with `disease` and optionally `countries` (default all),
+        `years` ([first, last], inclusive, default all), `group` (the key
+        of one of its metric groups, e.g. "psa" or "sac" for STH; `age` is
+        the older name), `metrics` (default all, or all of the group; they
+        have to be in the group when one is given) and `averages` (per-country
+        means instead of the rows).
+    """
+    if not isinstance(query, dict):
+        raise QueryError("a query is a JSON object, got {!r}".format(query))
+    c = cube(query.get("disease"))
+    countries = _strings(query.get("countries"), "countries") or c.countries.tolist()
+    unknown = sorted(set(countries) - set(c.code))
+    if unknown:
+        raise QueryError("unknown countries: {}".format(", ".join(unknown)))
+    years = query.get("years") or [int(c.years[0]), int(c.years[-1])]
+    try:
+        first, last = (int(y) for y in years)
+    except (TypeError, ValueError):  # also not two of them
+        raise QueryError("years should be [first, last], got {!r}".format(years))
+    metrics = _strings(query.get("metrics"), "metrics")
+    unknown = sorted(set(metrics or []) - set(c.metrics))
+    if unknown:
+        raise QueryError("unknown metrics: {}".format(", ".join(unknown)))
+    group = query.get("group", query.get("age"))
+    if group is not None:
+        keys = datastore.DATASETS[query["disease"]].group_keys
+        if not keys:
+            raise QueryError("{} has no metric groups".format(query["disease"]))
+        if not isinstance(group, str) or group not in keys:
+            raise QueryError("group of {} is one of {}, got {!r}".format(query["disease"], sorted(keys), group))
+        columns = datastore.DATASETS[query["disease"]].columns(keys[group])
+        outside = [m for m in metrics or [] if m not in columns]
+        if outside:
+            raise QueryError("metrics not in group {}: {}".format(group, ", ".join(outside)))
+        metrics = metrics or [m for m in c.metrics if m in columns]  # all of the group, in cube order
+    metrics = metrics or c.metrics.tolist()
+    return {"disease": query["disease"], "countries": sorted(set(countries)), "years": [first, last],
+            "group": group, "metrics": metrics, "averages": bool(query.get("averages"))}
+
+
+def select(query):
+    """The frame a normalized query asks for, with `country` as a plain column."""
+    c = cube(query["disease"])
+    first, last = query["years"]
+    if query["averages"]:
+        df = c.means(query["countries"], first, last + 1)[query["metrics"]]
+    else:
+        df = c.rows(query["countries"], first, last + 1)
+        df = df[["year"] + query["metrics"]]
+    df = df.reset_index()
+    df["country"] = df["country"].astype(str)
+    return df
+
+
+def encode(df, fmt):
+    """Serializes a result frame as one of FORMATS."""
+    if fmt == "csv":
+        return df.to_csv(index=False).encode("utf-8")
+    buf = io.BytesIO()
+    if fmt == "parquet":
+        df.to_parquet(buf, index=False)
+    else:
+        import pyarrow as pa
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        with pa.ipc.new_stream(buf, table.schema) as writer:
+            writer.write_table(table)
+    return buf.getvalue()
+
+
+def run(queries, fmt):
+    """Answers one or more queries as a single encoded result, cached.
+
+    A batch is one table whose `query` column is the position of the query
+    each row answers.
+    """
+    if fmt not in FORMATS:
+        raise QueryError("unknown format {!r}, expected one of {}".format(fmt, sorted(FORMATS)))
+    queries = [normalize(q) for q in queries]
+    versions = [cube(q["disease"]).version_of(q["countries"]) for q in queries]
+    key = sharedcache.key("query", queries, versions, fmt)
+    cached = sharedcache.fetch(key)
+    if cached is not None:
+        return cached
+    if len(queries) == 1:
+        df = select(queries[0])
+    else:
+        df = pd.concat([select(q).assign(query=i) for i, q in enumerate(queries)], ignore_index=True)
+    body = encode(df, fmt)
+    sharedcache.store(key, body)
+    return body
+
+
+def datasets():
+    """countries, years and metrics of each dataset"""
+    info = {}
+    for disease in datastore.DATASETS:
+        c = cube(disease)
+        info[disease] = {"countries": c.countries.tolist(), "years": [int(c.years[0]), int(c.years[-1])],
+                         "metrics": c.metrics.tolist(), "groups": sorted(datastore.DATASETS[disease].group_keys),
+                         "version": c.version}
+    return info
+
+
+def _chunks(body, fmt):
+    """CSV goes out in chunks of CHUNK_ROWS lines, binary formats whole"""
+    if fmt != "csv":
+        yield body
+        return
+    lines = body.splitlines(keepends=True)
+    for i in range(0, len(lines), CHUNK_ROWS):
+        yield b"".join(lines[i:i + CHUNK_ROWS])
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # needed for chunked responses
+
+    def _send(self, status, body, content_type="application/json", fmt=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        if fmt == "csv":
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for chunk in _chunks(body, fmt):
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+            self.wfile.write(b"0\r\n\r\n")
+        else:
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    def _error(self, status, message):
+        self._send(status, json.dumps({"error": message}).encode("utf-8"))
+
+    def _answer(self, queries, fmt):
+        try:
+            body = run(queries, fmt)
+        except QueryError as e:
+            return self._error(400, str(e))
+        except Exception as e:  # still answer, rather than drop the connection
+            self.log_error("query failed: %r", e)
+            return self._error(500, "{}: {}".format(type(e).__name__, e))
+        self._send(200, body, FORMATS[fmt], fmt)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        name = url.path.strip("/")
+        if name == "datasets":
+            return self._send(200, json.dumps(datasets()).encode("utf-8"))
+        if name not in datastore.DATASETS:
+            return self._error(404, "no such endpoint: /" + name)
+        query = {"disease": name,
+                 "countries": [c for v in params.get("country", []) for c in v.split(",") if c],
+                 "years": params["years"][0].split(",") if "years" in params else None,
+                 "group": params.get("group", params.get("age", [None]))[0],
+                 "metrics": params.get("metric"),
+                 "averages": params.get("averages", ["0"])[0] not in ("", "0", "false")}
+        self._answer([query], params.get("format", ["arrow"])[0])
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path.strip("/") != "batch":
+            return self._error(404, "no such endpoint: " + url.path)
+        try:
+            queries = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        except ValueError:
+            return self._error(400, "expected a JSON list of queries")
+        if not isinstance(queries, list) or not queries:
+            return self._error(400, "expected a JSON list of queries")
+        self._answer(queries, parse_qs(url.query).get("format", ["arrow"])[0])
+
+
+def serve(host="127.0.0.1", port=8502):
+    server = ThreadingHTTPServer((host, port), Handler)
+    print("serving on http://{}:{}".format(host, port), flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query the cleaned LF/STH data.")
+    parser.add_argument("disease", nargs="?", choices=sorted(datastore.DATASETS))
+    parser.add_argument("-c", "--country", action="append", help="repeatable; default every country")
+    parser.add_argument("--years", nargs=2, type=int, metavar=("FIRST", "LAST"))
+    parser.add_argument("--group", "--age", help="metric group, e.g. psa or sac for sth")
+    parser.add_argument("-m", "--metric", action="append", help="repeatable; default every metric")
+    parser.add_argument("--averages", action="store_true", help="per-country averages instead of rows")
+    parser.add_argument("--batch", metavar="FILE", help="JSON file with a list of queries")
+    parser.add_argument("-f", "--format", choices=sorted(FORMATS), default="csv")
+    parser.add_argument("-o", "--out", help="output file, default stdout")
+    parser.add_argument("--serve", action="store_true", help="run the HTTP service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8502)
+    args = parser.parse_args(argv)
+
+    if args.serve:
+        return serve(args.host, args.port)
+    if args.batch:
+        with open(args.batch, encoding="utf-8") as f:
+            queries = json.load(f)
+    elif args.disease:
+        queries = [{"disease": args.disease, "countries": args.country, "years": args.years,
+                    "group": args.group, "metrics": args.metric, "averages": args.averages}]
+    else:
+        parser.error("give a disease, --batch or --serve")
+    try:
+        body = run(queries, args.format)
+    except QueryError as e:
+        parser.error(str(e))
+    if args.out:
+        with open(args.out, "wb") as f:
+            f.write(body)
+    else:
+        sys.stdout.buffer.write(body)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,220 @@
+"""Batch country reports for every dataset.
+
+Renders one report per country (or per named group of countries) and disease,
+using the same charts as the pages (`engine.figures`) and the same
+per-country averages as their tables. Reports are spread over a process pool
+and a report is skipped when its inputs (data snapshot, selection, format)
+haven't changed since it was last written.
+
+    python reports.py                                # every country, both diseases
+    python reports.py -d lf --years 2010 2019 -f pdf
+    python reports.py --group "Sahel=Mali,Niger,Chad" --group "East=Kenya,Uganda"
+
+HTML reports load plotly.js from its CDN. PDF reports need the optional
+`kaleido` package to turn the charts into images.
+"""
+import argparse
+import hashlib
+import html
+import json
+import os
+import re
+import sys
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import lru_cache
+
+import datasets
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+OUT_DIR = os.path.join(HERE, "reports")
+MANIFEST = "manifest.json"
+
+# bump when the report layout changes so every report is rendered again
+REPORT_VERSION = 2
+
+
+@lru_cache(maxsize=None)
+def _cube(disease):
+    """one cube per disease per worker process"""
+    import datastore
+    return datastore.cube(disease)
+
+
+def _sections(disease, countries, year):
+    """(heading, figures, averages) for each part of a report"""
+    cube = _cube(disease)
+    # the pages treat the slider range as [start, end); reports include the end year
+    data = cube.rows(countries, year[0], year[1] + 1)
+    averages = cube.means(countries, year[0], year[1] + 1).round(2)
+    import engine
+    spec = datasets.load(disease)
+    # one section per metric group, headed by the group when there are several
+    return [(spec.group_heading.format(group) if len(spec.groups) > 1 else "",
+             engine.figures(spec, data, group, year),
+             averages[spec.columns(group)] if len(spec.groups) > 1 else averages) for group in spec.groups]
+
+
+def _html(title, sections):
+    parts = ["<html><head><meta charset='utf-8'><title>{0}</title></head><body>"
+             "<h1>{0}</h1>".format(html.escape(title))]
+    plotlyjs = "cdn"
+    for heading, figs, averages in sections:
+        if heading:
+            parts.append("<h2>{}</h2>".format(html.escape(heading)))
+        for fig in figs:
+            parts.append(fig.to_html(full_html=False, include_plotlyjs=plotlyjs))
+            plotlyjs = False  # only load it once
+        parts.append("<h3>Average values by country</h3>")
+        parts.append(averages.to_html())
+    parts.append("</body></html>")
+    return "\n".join(parts)
+
+
+def _table_page(title, heading, averages, size):
+    from PIL import Image, ImageDraw
+    page = Image.new("RGB", size, "white")
+    draw = ImageDraw.Draw(page)
+    text = "{}\n{}\n\nAverage values by country\n\n{}".format(title, heading, averages.T.to_string())
+    draw.multiline_text((40, 40), text, fill="black")
+    return page
+
+
+def _pdf(title, sections, path):
+    import io
+    from PIL import Image
+    pages = []
+    for heading, figs, averages in sections:
+        for fig in figs:
+            png = fig.to_image(format="png", width=1000, height=600)  # needs kaleido
+            pages.append(Image.open(io.BytesIO(png)).convert("RGB"))
+        pages.append(_table_page(title, heading, averages, (1000, 600)))
+    pages[0].save(path, "PDF", save_all=True, append_images=pages[1:])
+
+
+def render(job):
+    """Renders one report; runs in a worker process."""
+    disease, name, countries, year, fmt, path = job
+    title = "{} - {} ({} to {})".format(datasets.load(disease).title, name, year[0], year[1])
+    sections = _sections(disease, list(countries), year)
+    tmp = "{}.{}.tmp".format(path, os.getpid())
+    if fmt == "pdf":
+        _pdf(title, sections, tmp)
+    else:
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(_html(title, sections))
+    os.replace(tmp, path)
+    return path
+
+
+def _slug(name):
+    name = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode()
+    return re.sub(r"[^a-z0-9]+", "-", name.lower()).strip("-")
+
+
+def _fingerprint(disease, countries, year, fmt):
+    # keyed on the countries' own rows, so ingesting new rows only re-renders their reports
+    key = [REPORT_VERSION, _cube(disease).version_of(countries), sorted(countries), list(year), fmt]
+    return hashlib.sha256(json.dumps(key).encode()).hexdigest()
+
+
+def plan(diseases, groups, years, fmt, out_dir):
+    """Lists the report jobs, one per disease and country (or group).
+
+    Parameters
+    ----------
+    groups:
+        {report name: [countries]}; None means one report per country.
+    years:
+        (first, last) year, inclusive; None means the whole dataset.
+
+    Raises ValueError when a group names a country the dataset doesn't have.
+    """
+    jobs = []
+    for disease in diseases:
+        cube = _cube(disease)
+        year = years or (int(cube.years[0]), int(cube.years[-1]))
+        for name, countries in (groups or {c: [c] for c in cube.countries}).items():
+            unknown = sorted(set(countries) - set(cube.code))
+            if unknown:
+                raise ValueError("{}: unknown countries in {}: {}".format(disease, name, ", ".join(unknown)))
+            path = os.path.join(out_dir, "{}-{}-{}-{}.{}".format(disease, _slug(name), year[0], year[1], fmt))
+            jobs.append(((disease, name, tuple(countries), year, fmt, path),
+                         _fingerprint(disease, countries, year, fmt)))
+    return jobs
+
+
+def run(jobs, out_dir, workers=None, force=False):
+    """Renders the jobs whose inputs changed. Returns (rendered, skipped, failed) paths."""
+    os.makedirs(out_dir, exist_ok=True)
+    manifest_path = os.path.join(out_dir, MANIFEST)
+    try:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+
+    todo, skipped = {}, []
+    for job, fingerprint in jobs:
+        path = job[-1]
+        name = os.path.basename(path)
+        if not force and manifest.get(name) == fingerprint and os.path.exists(path):
+            skipped.append(path)
+        else:
+            todo[path] = (job, fingerprint)
+
+    rendered, failed = [], []
+    if todo:
+        with ProcessPoolExecutor(workers) as pool:
+            futures = {pool.submit(render, job): (path, fingerprint)
+                       for path, (job, fingerprint) in todo.items()}
+            for future in as_completed(futures):
+                path, fingerprint = futures[future]
+                try:
+                    future.result()
+                except Exception as e:  # keep going, the rest can still be rendered
+                    failed.append(path)
+                    print("failed {}: {}".format(path, e), file=sys.stderr, flush=True)
+                    continue
+                manifest[os.path.basename(path)] = fingerprint
+                rendered.append(path)
+                print("wrote " + path, flush=True)
+        tmp = manifest_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+        os.replace(tmp, manifest_path)
+    return rendered, skipped, failed
+
+
+def _group(value):
+    name, _, countries = value.partition("=")
+    if not countries:
+        raise argparse.ArgumentTypeError("expected NAME=Country,Country,...")
+    return name.strip(), [c.strip() for c in countries.split(",") if c.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render country reports in batch.")
+    parser.add_argument("-d", "--disease", action="append", choices=datasets.names())
+    parser.add_argument("-g", "--group", action="append", type=_group,
+                        help="NAME=Country,Country,... (repeatable); default is one report per country")
+    parser.add_argument("--years", nargs=2, type=int, metavar=("FIRST", "LAST"))
+    parser.add_argument("-f", "--format", choices=["html", "pdf"], default="html")
+    parser.add_argument("-o", "--out", default=OUT_DIR)
+    parser.add_argument("-j", "--workers", type=int, help="worker processes, default one per CPU")
+    parser.add_argument("--force", action="store_true", help="render even if nothing changed")
+    args = parser.parse_args(argv)
+
+    groups = dict(args.group) if args.group else None
+    try:
+        jobs = plan(args.disease or datasets.names(), groups, tuple(args.years) if args.years else None,
+                    args.format, args.out)
+    except ValueError as e:
+        parser.error(str(e))
+    rendered, skipped, failed = run(jobs, args.out, args.workers, args.force)
+    print("{} rendered, {} unchanged, {} failed".format(len(rendered), len(skipped), len(failed)))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,84 @@
+"""Builds the parts of a page side by side and shows each one as it is ready.
+
+Once a Fetch has sliced its data, the map, the charts and the table don't
+depend on each other, yet they used to be built one after another, so nothing
+below the map appeared before the map was done. A Scheduler reserves a slot
+for every part in page order, builds the parts on a thread pool and fills the
+slots from the script thread as the builds finish.
+
+Streamlit calls only work on the script thread, so a part is split into a
+`build` function, which runs on the pool and must not touch `st`, and a `show`
+function, which gets the built value and draws it. Threads rather than
+processes because the built figures and maps would otherwise have to be
+pickled back, and the slow parts (pandas, JSON encoding, network lookups)
+overlap well enough on threads. Set NTD_RENDER_WORKERS to size the pool
+(default 4); 0 builds every part inline, in page order.
+
+The pool is shared by every session of the process, so a part only goes to
+the pool when a worker is free. Otherwise it is built inline on the session's
+own script thread, as it was before, and a slow build (a geocoder lookup, a
+stalled cache disk) can't hold up the other sessions' parts.
+"""
+import itertools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import streamlit as st
+
+WORKERS = int(os.environ.get("NTD_RENDER_WORKERS", 4))
+
+# one pool for every session of the process
+_pool = ThreadPoolExecutor(WORKERS, thread_name_prefix="ntd-render") if WORKERS > 0 else None
+_free = threading.BoundedSemaphore(WORKERS) if WORKERS > 0 else None
+
+
+def _submit(build):
+    """starts `build` on the pool if a worker is free, otherwise returns None"""
+    if _pool is None or not _free.acquire(blocking=False):
+        return None
+
+    def task():
+        try:
+            return build()
+        finally:
+            _free.release()
+    return _pool.submit(task)
+
+
+class Scheduler:
+    """The parts of one Fetch.
+
+    Usage:
+        parts = scheduler.Scheduler()
+        parts.add("map", lambda: map_html(averages), show_map)
+        parts.add("table", lambda: table(averages), show_table)
+        parts.run()
+    """
+    def __init__(self):
+        self.parts = []
+
+    def add(self, name, build, show):
+        """Reserves a slot below the previous one and starts building into it."""
+        slot = st.empty()
+        slot.caption("Loading {}…".format(name))
+        future = _submit(build)  # None means it's built inline by run
+        self.parts.append((name, build, show, slot, future))
+
+    def run(self):
+        """Shows every part as soon as it is built. Returns {name: built value}."""
+        # inline parts first, in page order, while the pool works on the rest
+        inline = [part for part in self.parts if part[-1] is None]
+        by_future = {part[-1]: part for part in self.parts if part[-1] is not None}
+        done = itertools.chain(inline, (by_future[future] for future in as_completed(by_future)))
+        results = {}
+        for name, build, show, slot, future in done:
+            try:
+                value = future.result() if future is not None else build()
+            except Exception as e:  # one broken part shouldn't blank the others
+                slot.exception(e)
+                continue
+            with slot.container():
+                show(value)
+            results[name] = value
+        return results
@@ -0,0 +1,248 @@
+"""Result cache shared by every Streamlit process on a host.
+
+`@st.cache` and figcache only help the process that filled them. Anything
+written here - figure JSON, rendered map HTML, geocoding results - is visible
+to every worker and replica that points at the same location and survives
+restarts. Keys are content addressed: callers hash the data snapshot version
+together with the selection (see `key`), so new data never hits old entries.
+
+Pick the backend with NTD_CACHE:
+
+    disk:/some/dir      one file per entry (the default, under .cache/)
+    sqlite:/some/file   a single SQLite database
+    none                turn the shared cache off
+
+NTD_CACHE_MB (default 256) bounds the total size, oldest entries are evicted
+first, and NTD_CACHE_TTL (seconds, default 7 days) bounds their age.
+"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def key(*parts):
+    """sha256 of the JSON encoded parts, e.g. key("map", version, countries, years)"""
+    blob = json.dumps(parts, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class NullCache:
+    def get(self, key):
+        return None
+
+    def set(self, key, value):
+        pass
+
+    def clear(self):
+        pass
+
+
+class DiskCache:
+    """One file per entry under `root`; writes are atomic renames.
+
+    Parameters
+    ----------
+    root:
+        directory holding the entries, created on the first write.
+    max_bytes:
+        total size above which the least recently used entries are removed.
+    ttl:
+        seconds after which an entry is treated as missing.
+    """
+    def __init__(self, root, max_bytes=256 << 20, ttl=7 * 86400):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._written = 0
+
+    def _path(self, key):
+        return os.path.join(self.root, key[:2], key[2:])
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl:
+                os.remove(path)
+                return None
+            with open(path, "rb") as f:
+                value = f.read()
+            os.utime(path, (time.time(), os.path.getmtime(path)))  # atime marks recent use
+        except OSError:
+            return None
+        return value
+
+    def set(self, key, value):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = "{}.{}.{}.tmp".format(path, os.getpid(), threading.get_ident())
+        with open(tmp, "wb") as f:
+            f.write(value)
+        os.replace(tmp, path)
+        self._written += len(value)
+        if self._written > self.max_bytes // 10:  # don't scan the directory on every write
+            self._written = 0
+            self.evict()
+
+    def _entries(self):
+        if not os.path.isdir(self.root):  # nothing written yet
+            return
+        for sub in os.listdir(self.root):
+            folder = os.path.join(self.root, sub)
+            if not os.path.isdir(folder):
+                continue
+            for name in os.listdir(folder):
+                if name.endswith(".tmp"):
+                    continue
+                try:
+                    yield os.path.join(folder, name), os.stat(os.path.join(folder, name))
+                except OSError:  # removed by another process meanwhile
+                    pass
+
+    def evict(self):
+        """drops expired entries, then the least recently used ones until under max_bytes"""
+        now = time.time()
+        entries, total = [], 0
+        for path, stat in self._entries():
+            if now - stat.st_mtime > self.ttl:
+                _remove(path)
+                continue
+            entries.append((stat.st_atime, stat.st_size, path))
+            total += stat.st_size
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            _remove(path)
+            total -= size
+
+    def clear(self):
+        for path, _ in list(self._entries()):
+            _remove(path)
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class SqliteCache:
+    """All entries in one SQLite database, safe to share between processes.
+
+    Takes the same `max_bytes` and `ttl` as DiskCache.
+    """
+    def __init__(self, path, max_bytes=256 << 20, ttl=7 * 86400):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._local = threading.local()
+        with self._db() as db:
+            db.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB,"
+                       " created REAL, used REAL, size INTEGER)")
+
+    def _db(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            db = sqlite3.connect(self.path, timeout=30)
+            db.execute("PRAGMA journal_mode=WAL")
+            self._local.db = db
+        return db
+
+    def get(self, key):
+        db = self._db()
+        row = db.execute("SELECT value, created FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        with db:
+            if now - row[1] > self.ttl:
+                db.execute("DELETE FROM cache WHERE key = ?", (key,))
+                return None
+            db.execute("UPDATE cache SET used = ? WHERE key = ?", (now, key))
+        return row[0]
+
+    def set(self, key, value):
+        now = time.time()
+        with self._db() as db:
+            db.execute("INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?)",
+                       (key, value, now, now, len(value)))
+            db.execute("DELETE FROM cache WHERE created < ?", (now - self.ttl,))
+            total = db.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+            if total > self.max_bytes:
+                # walk the least recently used entries until enough space is freed
+                excess, doomed = total - self.max_bytes, []
+                for k, size in db.execute("SELECT key, size FROM cache ORDER BY used"):
+                    if excess <= 0:
+                        break
+                    doomed.append((k,))
+                    excess -= size
+                db.executemany("DELETE FROM cache WHERE key = ?", doomed)
+
+    def clear(self):
+        with self._db() as db:
+            db.execute("DELETE FROM cache")
+
+
+def from_env():
+    """Builds the backend configured by NTD_CACHE / NTD_CACHE_MB / NTD_CACHE_TTL."""
+    spec = os.environ.get("NTD_CACHE", "disk:" + os.path.join(HERE, ".cache"))
+    kind, _, location = spec.partition(":")
+    max_bytes = int(float(os.environ.get("NTD_CACHE_MB", 256)) * (1 << 20))
+    ttl = float(os.environ.get("NTD_CACHE_TTL", 7 * 86400))
+    if kind == "none":
+        return NullCache()
+    if kind == "sqlite":
+        return SqliteCache(location or os.path.join(HERE, ".cache.sqlite"), max_bytes, ttl)
+    if kind == "disk":
+        return DiskCache(location or os.path.join(HERE, ".cache"), max_bytes, ttl)
+    raise ValueError("unknown NTD_CACHE backend {!r}".format(kind))
+
+
+log = logging.getLogger(__name__)
+try:
+    cache = from_env()
+except (OSError, sqlite3.Error) as e:  # e.g. a read-only checkout: run uncached rather than not at all
+    log.warning("shared cache unavailable, running without it: %s", e)
+    cache = NullCache()
+
+
+def fetch(key):
+    """cache.get that treats a broken or unreachable backend as a miss"""
+    try:
+        return cache.get(key)
+    except (OSError, sqlite3.Error) as e:
+        log.warning("shared cache read failed: %s", e)
+        return None
+
+
+def store(key, value):
+    """cache.set that never fails the caller"""
+    try:
+        cache.set(key, value)
+    except (OSError, sqlite3.Error) as e:
+        log.warning("shared cache write failed: %s", e)
+
+
+def get_text(key):
+    value = fetch(key)
+    return None if value is None else value.decode("utf-8")
+
+
+def set_text(key, value):
+    store(key, value.encode("utf-8"))
+
+
+def get_json(key):
+    value = fetch(key)
+    return None if value is None else json.loads(value)
+
+
+def set_json(key, value):
+    store(key, json.dumps(value).encode("utf-8"))
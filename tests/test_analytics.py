@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import analytics
+import datasets
+import datastore
+from cube import Cube
+
+
+def _reference(df, coverage, required, treated, target, lo, hi):
+    """the summary table worked out with plain pandas, one country at a time"""
+    yearly = df.groupby([df.index.astype(str), "year"])[[coverage, required, treated]].mean()
+    years = range(int(df["year"].min()), int(df["year"].max()) + 1)
+    ranks = yearly[coverage].unstack().reindex(columns=years).rank(ascending=False, method="min")
+    rows = {}
+    for country, g in yearly.groupby(level=0):
+        g = g.droplevel(0).reindex(years)
+        window = g.loc[lo:hi - 1]
+        change = g[coverage].diff().loc[lo + 1:hi - 1].mean()
+        t = window[treated].fillna(0)
+        positive = t[t > 0]
+        cagr = np.nan
+        if len(positive) and positive.index[-1] > positive.index[0]:
+            first, last = positive.index[0], positive.index[-1]
+            cagr = ((t[last] / t[first]) ** (1 / (last - first)) - 1) * 100
+        below = (window[coverage] < target).astype(int)
+        streak = below.groupby((below == 0).cumsum()).cumsum().max()
+        gap = (window[required] - window[treated]).mean()
+        rows[country] = [change, cagr, ranks.loc[country, hi - 1], streak, gap]
+    return pd.DataFrame.from_dict(rows, orient="index", columns=list(analytics.METRICS))
+
+
+@pytest.mark.parametrize("name", ["lf", "sth"])
+@pytest.mark.parametrize("lo, hi", [(2003, 2020), (2010, 2016), (2019, 2020)])
+def test_table_matches_pandas(name, lo, hi):
+    spec = datasets.load(name)
+    df = datastore.load(name)
+    cube = Cube(df)
+    for group in spec.groups:
+        columns = spec.metrics(group)
+        stats = analytics.Analytics(cube, columns["coverage"], columns["required"], columns["treated"], spec.target)
+        countries = cube.countries.tolist()
+        table = stats.table(countries, lo, hi)
+        expected = _reference(df, columns["coverage"], columns["required"], columns["treated"], spec.target, lo, hi)
+        expected = expected.loc[table.index]  # countries without rows in the range aren't in the table
+        pd.testing.assert_frame_equal(table, expected, check_names=False, check_dtype=False, rtol=1e-5, atol=1e-6)
+
+
+def test_cagr_needs_two_treated_years():
+    spec = datasets.load("sth")
+    columns = spec.metrics("School-Aged (SA)")
+    cube = Cube(datastore.load("sth"))
+    stats = analytics.Analytics(cube, columns["coverage"], columns["required"], columns["treated"], spec.target)
+    # single year selections, and countries that only treated in one year
+    assert stats.table(["Mali", "Kenya"], 2015, 2016)[analytics.CAGR].isna().all()
+    assert stats.table(["Botswana", "Namibia"], 2003, 2020)[analytics.CAGR].isna().all()
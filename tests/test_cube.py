@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+
+from cube import Cube
+
+
+def _cube():
+    df = pd.DataFrame({"country": ["Mali", "Mali", "Kenya", "Kenya"], "year": [2018, 2019, 2018, 2019],
+                       "treated": [10.0, 20.0, 30.0, 40.0], "coverage": [0.5, 0.6, 0.7, 0.8]})
+    return Cube(df.set_index("country"))
+
+
+def test_bands():
+    bands = _cube().bands(["Mali", "Kenya"], 2018, 2020)
+    assert bands.index.tolist() == [2018, 2019]
+    assert bands[("treated", "total")].tolist() == [40.0, 60.0]
+    assert np.allclose(bands[("coverage", "median")], [0.6, 0.7])
+    assert bands[("coverage", "countries")].tolist() == [2, 2]
+
+
+def test_bands_empty_span():
+    # a single year on the slider is the empty range [2019, 2019)
+    for lo, hi in [(2019, 2019), (2030, 2031)]:
+        bands = _cube().bands(["Mali", "Kenya"], lo, hi)
+        assert bands.empty
+        assert list(bands.columns.levels[1]) == ["countries", "median", "p25", "p75", "total"]
+
+
+def test_bands_no_countries():
+    bands = _cube().bands([], 2018, 2020)
+    assert len(bands) == 2
+    assert np.isnan(bands[("coverage", "median")]).all()
@@ -0,0 +1,24 @@
+import pytest
+
+import datasets
+import query
+
+
+@pytest.mark.parametrize("q", [
+    {"disease": "sth", "group": ["psa"]},
+    {"disease": "sth", "group": 1},
+    {"disease": "sth", "group": "psa", "metrics": ["National coverage, SAC"]},
+    {"disease": "lf", "group": "psa"},
+    {"disease": "sth", "metrics": ["no such metric"]},
+])
+def test_bad_queries(q):
+    with pytest.raises(query.QueryError):
+        query.normalize(q)
+
+
+def test_group_metrics():
+    spec = datasets.load("sth")
+    psa = spec.columns(spec.group_keys["psa"])
+    assert sorted(query.normalize({"disease": "sth", "group": "psa"})["metrics"]) == sorted(psa)
+    assert query.normalize({"disease": "sth", "age": "psa", "metrics": psa[:1]})["metrics"] == psa[:1]
+    assert len(query.normalize({"disease": "sth"})["metrics"]) > len(psa)
@@ -0,0 +1,17 @@
+import sharedcache
+
+
+def test_disk_cache_unwritable(tmp_path, monkeypatch):
+    # a root that can't be created: the cache misses instead of failing the page
+    blocker = tmp_path / "file"
+    blocker.write_text("")
+    monkeypatch.setattr(sharedcache, "cache", sharedcache.DiskCache(str(blocker / "cache")))
+    sharedcache.store("abcd", b"value")
+    assert sharedcache.fetch("abcd") is None
+
+
+def test_disk_cache_created_on_write(tmp_path):
+    cache = sharedcache.DiskCache(str(tmp_path / "cache"))
+    assert not (tmp_path / "cache").exists()
+    cache.set("abcd", b"value")
+    assert cache.get("abcd") == b"value"